@@ -1,132 +1,283 @@
 import json
 from weaviate_recommend import WeaviateRecommendClient
-import weaviate.classes.config as wvcc
 from dotenv import load_dotenv
 import os
 from tqdm import tqdm
 from wasabi import msg
 from weaviate_recommend.models.data import RecommenderItem
 import time
+import random
+import argparse
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from ingest_manifest import IngestManifest
+from card_records import normalize_scryfall, to_items
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Configuration
-train_at = 10000
-start_at = -1
 
-msg.divider(f"Starting ingestion process at {start_at} and training at {train_at}")
+def content_hash(item: RecommenderItem) -> str:
+    encoded = json.dumps(item.properties, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
 
-# Get the service URL and API key from environment variables
-service_url = os.getenv("SERVICE_URL")
-api_key = os.getenv("API_KEY")
 
-# Create a client instance
-client = WeaviateRecommendClient(service_url, api_key)
-
-file_path = "../dataset/all_cards.jsonl"
-
-# Count total number of lines in the file
-with open(file_path, "r") as f:
-    total_lines = sum(1 for _ in f)
-
-batch_size = 1000
-counter = 0
-items = []
-
-with open(file_path, "r") as file:
-    for line in tqdm(file, total=total_lines, desc="Processing cards"):
+def build_batch(lines: list[bytes]) -> list[tuple[RecommenderItem, str]]:
+    # Runs in a parser process, so JSON decoding and item construction use all cores
+    records = []
+    for line in lines:
         try:
-            card = json.loads(line.strip())
-            item_properties = {
-                "card_id": card["id"],
-                "oracle_id": card.get("oracle_id", ""),
-                "name": card["name"],
-                "released_at": card.get("released_at", ""),
-                "uri": card["uri"],
-                "scryfall_uri": card["scryfall_uri"],
-                "image_uri": (
-                    card["image_uris"]["normal"] if "image_uris" in card else ""
-                ),
-                "type_line": card.get("type_line", ""),
-                "oracle_text": card.get("oracle_text", ""),
-                "colors": card.get("colors", []),
-                "color_identity": card.get("color_identity", []),
-                "keywords": card.get("keywords", []),
-                "produced_mana": card.get("produced_mana", []),
-                "set_name": card.get("set_name", ""),
-                "rarity": card.get("rarity", ""),
-                "power": card.get("power", ""),
-                "toughness": card.get("toughness", ""),
-                "mana_cost": card.get("mana_cost", ""),
-                "loyalty": card.get("loyalty", ""),
-                "defense": card.get("defense", ""),
-                "life_modifier": card.get("life_modifier", ""),
-                "hand_modifier": card.get("hand_modifier", ""),
-                "edhrec_rank": card.get("edhrec_rank", 0),
-                "cmc": card.get("cmc", 0),
-            }
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            msg.warn(f"Error decoding JSON: {e}")
+    return [
+        (item, content_hash(item)) for item in to_items(normalize_scryfall(records))
+    ]
+
 
+def read_batches(
+    file_path: str,
+    batch_size: int,
+    start_at: int,
+    train_at: int,
+    start_offset: int = 0,
+    counter: int = 0,
+):
+    """Yield (lines, byte_offset, counter) batches, cutting a batch short at train_at."""
+    lines = []
+    with open(file_path, "rb") as file:
+        file.seek(start_offset)
+        for line in file:
+            if not line.strip():
+                continue
             counter += 1
             if start_at <= counter:
-                items.append(RecommenderItem(id=card["id"], properties=item_properties))
-
-            if len(items) >= batch_size:
-                try:
-                    response = client.item.add_batch(items)
-                    msg.info(response)
-                except Exception as e:
-                    msg.fail(f"Error adding batch: {e}")
-                    exit(1)
-                items = []  # Clear the list after batch insertion
-
-            if counter == train_at:
-                # Add any remaining items before training
-                if items:
-                    try:
-                        response = client.item.add_batch(items)
-                        msg.info(response)
-                    except Exception as e:
-                        msg.fail(f"Error adding final batch before training: {e}")
-                        exit(1)
-                    items = []
-
-                # Start training
-                try:
-                    response = client.train(overwrite=True)
-                    msg.info(response)
-                except Exception as e:
-                    msg.fail(f"Error starting training: {e}")
-                    exit(1)
-
-                # Wait for training to complete
-                try:
-                    while client.is_training():
-                        msg.info("Training in progress...")
-                        time.sleep(10)  # Wait for 10 seconds before checking again
-                        status = client.train_status()
-                        if status.status == "error":
-                            msg.fail("Training failed!")
-                            msg.info(status)
-                            exit(1)
-                        msg.info(status)
-                except Exception as e:
-                    msg.fail(f"Error getting training status: {e}")
-                    exit(1)
+                lines.append(line)
+            if len(lines) >= batch_size or (counter == train_at and lines):
+                yield lines, file.tell(), counter
+                lines = []
+            elif counter == train_at:
+                yield [], file.tell(), counter
+        if lines:
+            yield lines, file.tell(), counter
 
-        except json.JSONDecodeError as e:
-            msg.warn(f"Error decoding JSON: {e}")
+
+def upload_batch(
+    client: WeaviateRecommendClient,
+    build_future,
+    known_hashes: dict[str, str],
+    retries: int,
+    backoff: float,
+):
+    """Upload the new or changed cards of a batch, returning (sent, skipped, confirmed)."""
+    built = build_future.result()
+    changed = [
+        (item, digest) for item, digest in built if known_hashes.get(item.id) != digest
+    ]
+    if not changed:
+        return 0, len(built), []
+
+    items = [item for item, _ in changed]
+    for attempt in range(retries + 1):
+        try:
+            response = client.item.add_batch(items)
+            msg.info(response)
+            return (
+                len(items),
+                len(built) - len(items),
+                [(item.id, digest) for item, digest in changed],
+            )
         except Exception as e:
-            msg.fail(f"Error processing card: {e}")
-            continue
+            if attempt == retries:
+                raise
+            delay = backoff * 2**attempt + random.uniform(0, backoff)
+            msg.warn(f"Error adding batch: {e}, retrying in {delay:.1f} seconds")
+            time.sleep(delay)
+
 
-# Add any remaining items in the last batch
-if items:
+def train(client: WeaviateRecommendClient):
     try:
-        response = client.item.add_batch(items)
+        response = client.train(overwrite=True)
         msg.info(response)
     except Exception as e:
-        msg.fail(f"Error adding final batch: {e}")
+        msg.fail(f"Error starting training: {e}")
         exit(1)
 
-msg.good("Ingestion process completed.")
+    # Wait for training to complete
+    try:
+        while client.is_training():
+            msg.info("Training in progress...")
+            time.sleep(10)  # Wait for 10 seconds before checking again
+            status = client.train_status()
+            if status.status == "error":
+                msg.fail("Training failed!")
+                msg.info(status)
+                exit(1)
+            msg.info(status)
+    except Exception as e:
+        msg.fail(f"Error getting training status: {e}")
+        exit(1)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Ingest the card dataset",
+        epilog="Exits with 1 if some batches could not be added, or 2 if that "
+        "also kept training at --train-at from starting.",
+    )
+    parser.add_argument("--file", default="../dataset/all_cards.jsonl")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--start-at", type=int, default=-1)
+    parser.add_argument("--train-at", type=int, default=10000)
+    parser.add_argument("--parse-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--upload-workers", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--backoff", type=float, default=1.0)
+    parser.add_argument("--manifest", default="ingest_manifest.sqlite")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Forget the manifest and upload every card again",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    msg.divider(
+        f"Starting ingestion process at {args.start_at} and training at {args.train_at}"
+    )
+
+    # Get the service URL and API key from environment variables
+    service_url = os.getenv("SERVICE_URL")
+    api_key = os.getenv("API_KEY")
+
+    # Create a client instance
+    client = WeaviateRecommendClient(service_url, api_key)
+
+    manifest = IngestManifest(args.manifest)
+    if args.full:
+        manifest.reset()
+    known_hashes = manifest.hashes()
+
+    # A run over the same file picks up after the last confirmed batch
+    stat = os.stat(args.file)
+    signature = f"{os.path.abspath(args.file)}:{stat.st_size}:{int(stat.st_mtime)}"
+    start_offset = 0
+    start_counter = 0
+    if manifest.get_state("file") == signature:
+        start_offset = int(manifest.get_state("offset", 0))
+        start_counter = int(manifest.get_state("counter", 0))
+        if start_offset > 0:
+            msg.info(f"Resuming at byte {start_offset} (card {start_counter})")
+    else:
+        manifest.checkpoint([], file=signature, offset=0, counter=0)
+    msg.info(f"{len(known_hashes)} cards already in the manifest")
+
+    if start_counter >= args.train_at and manifest.get_state("trained") != signature:
+        train(client)
+        manifest.checkpoint([], trained=signature)
+
+    # Bound the number of batches held in memory at once
+    max_in_flight = args.upload_workers * 2
+    in_flight = deque()
+    uploaded = 0
+    skipped = 0
+    failed = 0
+    training_skipped = False
+    start_time = time.time()
+
+    def complete_oldest():
+        nonlocal uploaded, skipped, failed
+        future, byte_offset, counter = in_flight.popleft()
+        try:
+            sent, unchanged, confirmed = future.result()
+            uploaded += sent
+            skipped += unchanged
+            if failed:
+                # Cards after a failed batch are recorded, but the resume point stays put
+                manifest.checkpoint(confirmed)
+            else:
+                manifest.checkpoint(confirmed, offset=byte_offset, counter=counter)
+        except Exception as e:
+            msg.fail(f"Error adding batch after {args.retries} retries: {e}")
+            failed += 1
+        progress.update(byte_offset - progress.n)
+        progress.set_postfix(
+            items_per_second=f"{uploaded / max(time.time() - start_time, 1e-9):.0f}",
+            skipped=skipped,
+        )
+
+    with ProcessPoolExecutor(args.parse_workers) as parsers, ThreadPoolExecutor(
+        args.upload_workers
+    ) as uploaders, tqdm(
+        total=stat.st_size,
+        initial=start_offset,
+        desc="Processing cards",
+        unit="B",
+        unit_scale=True,
+        unit_divisor=1024,
+    ) as progress:
+        for lines, byte_offset, counter in read_batches(
+            args.file,
+            args.batch_size,
+            args.start_at,
+            args.train_at,
+            start_offset,
+            start_counter,
+        ):
+            if lines:
+                while len(in_flight) >= max_in_flight:
+                    complete_oldest()
+                build_future = parsers.submit(build_batch, lines)
+                in_flight.append(
+                    (
+                        uploaders.submit(
+                            upload_batch,
+                            client,
+                            build_future,
+                            known_hashes,
+                            args.retries,
+                            args.backoff,
+                        ),
+                        byte_offset,
+                        counter,
+                    )
+                )
+
+            if counter == args.train_at:
+                # Every item up to train_at must be uploaded before training
+                while in_flight:
+                    complete_oldest()
+                if failed:
+                    # Training on a partial dataset would not be what was asked for
+                    msg.fail(
+                        f"Skipping training: {failed} batches before --train-at could not be added"
+                    )
+                    training_skipped = True
+                elif uploaded > 0 or manifest.get_state("trained") != signature:
+                    train(client)
+                    manifest.checkpoint([], trained=signature)
+
+        while in_flight:
+            complete_oldest()
+
+    elapsed = time.time() - start_time
+    msg.info(
+        f"Uploaded {uploaded} items and skipped {skipped} unchanged in {elapsed:.2f} seconds ({uploaded / max(elapsed, 1e-9):.0f} items/s)"
+    )
+    if failed:
+        msg.fail(f"{failed} batches could not be added, run again to resume")
+        manifest.close()
+        # 2 tells a caller that the model was not trained either
+        exit(2 if training_skipped else 1)
+
+    manifest.checkpoint([], offset=stat.st_size)
+    manifest.close()
+    msg.good("Ingestion process completed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,8 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
 from contextlib import asynccontextmanager
-from weaviate.classes.query import Filter
-import random
-import time
+import asyncio
 
 from .api_types import (
     GetCardsPayload,
@@ -13,13 +11,38 @@ from .api_types import (
     SearchCardsPayload,
     AddInteractionPayload,
     GetInteractionsPayload,
+    InteractionsPagePayload,
     SaveDeckPayload,
+    UpdateDeckPayload,
+    BatchRequest,
+    BatchRecommendationPayload,
 )
+from .recommender_executor import AsyncRecommenderClient
+from .card_catalog import CardCatalog, CATALOG_PROPERTIES, color_mask
+from .card_sampler import RandomCardSampler
+from .user_cache import KnownUserCache
+from .interaction_buffer import (
+    InteractionBatch,
+    InteractionBuffer,
+    InteractionBufferFullError,
+)
+from .interaction_index import InteractionIndex
+from .deck_store import DeckStore, decode_deck
+from .result_cache import ResultCache
+from .single_flight import SingleFlight
+from .prefetch_queue import RecommendationPrefetcher
+from .fallback_recommender import FallbackRecommender
+from .overfetch import AdaptiveOverfetch
+from .seen_cards import SeenCards, unseen_positions
+from .card_records import CARD_VIEWS, cards_from_objects, resolve_fields
+from .responses import FastJSONResponse, dumps, project
+from .metrics import Metrics, TimingMiddleware
+from .sampled_log import SampledLog
+from .background import cancel_tasks
 
 import weaviate
 from weaviate.auth import AuthApiKey
 from weaviate.classes.init import AdditionalConfig, Timeout
-from weaviate.classes.query import Sort
 from weaviate_recommend.models.data import User
 from weaviate_recommend.models.filter import FilterConfig
 
@@ -38,13 +61,167 @@ service_url = os.getenv("SERVICE_URL")
 api_key = os.getenv("API_KEY")
 
 # Create a client instance
-recommender_client = WeaviateRecommendClient(service_url, api_key)
-client = weaviate.use_async_with_weaviate_cloud(
-    cluster_url=os.getenv("WCD_URL"),
-    auth_credentials=AuthApiKey(os.getenv("WCD_API_KEY")),
-    additional_config=AdditionalConfig(timeout=Timeout(init=60, query=300, insert=300)),
+if os.getenv("RECOMMENDER_BACKEND") == "local":
+    # In-process stand-ins for offline load testing, see local_backend.py
+    from .local_backend import create_local_clients
+
+    recommender_client, client = create_local_clients()
+else:
+    recommender_client = WeaviateRecommendClient(service_url, api_key)
+    client = weaviate.use_async_with_weaviate_cloud(
+        cluster_url=os.getenv("WCD_URL"),
+        auth_credentials=AuthApiKey(os.getenv("WCD_API_KEY")),
+        additional_config=AdditionalConfig(
+            timeout=Timeout(init=60, query=300, insert=300)
+        ),
+    )
+
+# Latency histograms and error counts, exposed on /metrics
+metrics = Metrics()
+
+# Per-request log lines, level-gated and sampled so they stay cheap under load
+log = SampledLog(
+    level=os.getenv("LOG_LEVEL", "info"),
+    sample_rate=float(os.getenv("LOG_SAMPLE_RATE", 1.0)),
+)
+
+# Blocking recommender calls run on a bounded pool so they never stall the event loop
+recommender = AsyncRecommenderClient(
+    recommender_client,
+    max_workers=int(os.getenv("RECOMMENDER_POOL_SIZE", 8)),
+    max_queue=int(os.getenv("RECOMMENDER_MAX_QUEUE", 32)),
+    timeout=float(os.getenv("RECOMMENDER_TIMEOUT", 10)),
+    observe=lambda operation, seconds, failed: metrics.record_upstream(
+        "recommender", operation, seconds, failed
+    ),
+)
+
+# Users already confirmed to exist upstream, so user_check can skip the remote calls
+known_users = KnownUserCache(
+    max_size=int(os.getenv("USER_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("USER_CACHE_TTL", 3600)),
+)
+
+# Swipes are acknowledged once buffered and written to the recommender in batches
+interaction_buffer = InteractionBuffer(
+    lambda user_id, batch: flush_interactions(user_id, batch),
+    on_flushed=lambda user_id, count: interactions_flushed(user_id, count),
+    max_batch=int(os.getenv("INTERACTION_BATCH_SIZE", 50)),
+    chunk_size=int(os.getenv("INTERACTION_CHUNK_SIZE", 10)),
+    max_concurrent=int(os.getenv("INTERACTION_MAX_WRITERS", 2)),
+    flush_interval=float(os.getenv("INTERACTION_FLUSH_INTERVAL", 1.0)),
+    max_pending=int(os.getenv("INTERACTION_MAX_PENDING", 10000)),
+    max_attempts=int(os.getenv("INTERACTION_MAX_ATTEMPTS", 5)),
+    spill_path=os.getenv("INTERACTION_SPILL_PATH"),
+)
+
+# Each user's interaction history, loaded once and then kept current locally
+interaction_index = InteractionIndex(
+    lambda user_id: load_interaction_history(user_id),
+    max_entries=int(os.getenv("INTERACTION_INDEX_MAX_ENTRIES", 1_000_000)),
+    idle_ttl=float(os.getenv("INTERACTION_INDEX_IDLE_TTL", 3600)),
 )
 
+# Decks are served from memory and edits are written back in debounced batches
+deck_store = DeckStore(
+    lambda user_id: load_deck(user_id),
+    lambda user_id, deck_string: store_deck(user_id, deck_string),
+    debounce=float(os.getenv("DECK_SAVE_DEBOUNCE", 2.0)),
+    max_delay=float(os.getenv("DECK_SAVE_MAX_DELAY", 10.0)),
+    max_users=int(os.getenv("DECK_CACHE_USERS", 10000)),
+)
+
+# Item-to-item recommendations only change when the model is retrained
+recommendation_cache = ResultCache(
+    max_bytes=int(os.getenv("RECOMMENDATION_CACHE_BYTES", 64 * 1024 * 1024)),
+    ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", 300)),
+    stale_ttl=float(os.getenv("RECOMMENDATION_CACHE_STALE_TTL", 3600)),
+)
+training_check_interval = float(os.getenv("TRAINING_CHECK_INTERVAL", 60))
+MODEL_VERSION_FIELDS = (
+    "model_version",
+    "version",
+    "trained_at",
+    "last_trained_at",
+    "finished_at",
+    "updated_at",
+)
+
+# Search results; personalized ones are tagged with the user and dropped when
+# that user's interactions or deck change, the rest are shared across users
+search_cache = ResultCache(
+    max_bytes=int(os.getenv("SEARCH_CACHE_BYTES", 32 * 1024 * 1024)),
+    ttl=float(os.getenv("SEARCH_CACHE_TTL", 120)),
+    stale_ttl=float(os.getenv("SEARCH_CACHE_STALE_TTL", 0)),
+)
+
+# Identical concurrent upstream calls share one in-flight request
+inflight = SingleFlight()
+
+# Limits for /recommendations/batch
+batch_max_requests = int(os.getenv("BATCH_MAX_REQUESTS", 16))
+batch_max_timeout = float(os.getenv("BATCH_MAX_TIMEOUT", 10))
+
+# Static card data (names, image URIs, color identity) held in memory
+catalog = CardCatalog(
+    client,
+    os.getenv("COLLECTION_NAME"),
+    refresh_interval=float(os.getenv("CATALOG_REFRESH_INTERVAL", 300)),
+)
+
+# The next few from_user recommendations per active user, fetched ahead of the swipe
+prefetcher = RecommendationPrefetcher(
+    lambda user_id, limit, required: fetch_user_cards(user_id, limit, required),
+    depth=int(os.getenv("PREFETCH_DEPTH", 10)),
+    max_depth=int(os.getenv("PREFETCH_MAX_DEPTH", 50)),
+    low_watermark=int(os.getenv("PREFETCH_LOW_WATERMARK", 3)),
+    max_users=int(os.getenv("PREFETCH_MAX_USERS", 10000)),
+    idle_ttl=float(os.getenv("PREFETCH_IDLE_TTL", 900)),
+)
+
+# from_user cannot filter by color upstream, so mana filters are applied here
+mana_overfetch = AdaptiveOverfetch(
+    catalog.card_mask,
+    catalog.match_rate,
+    max_fetch=int(os.getenv("MANA_OVERFETCH_MAX", 200)),
+)
+
+# Cards each user already swiped, left out of every card listing
+seen_cards = SeenCards(
+    catalog,
+    lambda user_id: load_seen_history(user_id),
+    max_bytes=int(os.getenv("SEEN_CARDS_BYTES", 64 * 1024 * 1024)),
+    idle_ttl=float(os.getenv("SEEN_CARDS_IDLE_TTL", 3600)),
+    warm_timeout=float(os.getenv("SEEN_CARDS_WARM_TIMEOUT", 0.25)),
+)
+seen_overfetch = AdaptiveOverfetch(
+    catalog.card_mask,
+    lambda required: 1.0,
+    max_fetch=int(os.getenv("SEEN_OVERFETCH_MAX", 100)),
+)
+
+# Content-based recommendations served locally while the recommender is failing
+fallback = FallbackRecommender(
+    client,
+    os.getenv("COLLECTION_NAME"),
+    n_features=int(os.getenv("FALLBACK_FEATURES", 1 << 18)),
+)
+fallback_history_timeout = float(os.getenv("FALLBACK_HISTORY_TIMEOUT", 1.0))
+
+metrics.register("recommender", recommender.stats)
+metrics.register("user_cache", known_users.stats)
+metrics.register("interactions", interaction_buffer.stats)
+metrics.register("interaction_index", interaction_index.stats)
+metrics.register("decks", deck_store.stats)
+metrics.register("recommendation_cache", recommendation_cache.stats)
+metrics.register("search_cache", search_cache.stats)
+metrics.register("single_flight", inflight.stats)
+metrics.register("prefetch", prefetcher.stats)
+metrics.register("fallback", fallback.stats)
+metrics.register("mana_overfetch", mana_overfetch.stats)
+metrics.register("seen_cards", seen_cards.stats)
+metrics.register("seen_overfetch", seen_overfetch.stats)
+
 
 async def initialize_weaviate_client():
     await client.connect()
@@ -53,12 +230,36 @@ async def initialize_weaviate_client():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await initialize_weaviate_client()
+    try:
+        await catalog.load()
+    except Exception as e:
+        # The catalog is loaded lazily on first use instead
+        msg.fail(f"An error occurred while loading the card catalog: {str(e)}")
+    sampler.schedule_refill()
+    fallback.schedule_load()
+    await interaction_buffer.start()
+    training_watcher = asyncio.create_task(watch_training())
     yield
+    await cancel_tasks([training_watcher])
+    # Write out what is still buffered; flushing may schedule more background work
+    await deck_store.stop()
+    await interaction_buffer.stop()
+    # so that is stopped next, and nothing submits to the pool once it is shut down
+    await prefetcher.stop()
+    await seen_cards.stop()
+    await interaction_index.stop()
+    await recommendation_cache.stop()
+    await search_cache.stop()
+    await inflight.stop()
+    await sampler.stop()
+    await fallback.stop()
+    await catalog.stop()
     await client.close()
+    recommender.shutdown()
 
 
 # FastAPI App
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Allow requests only from the same origin
 app.add_middleware(
@@ -68,446 +269,944 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(TimingMiddleware, metrics=metrics)
 
 
 @app.get("/health")
 async def health_check():
-    return JSONResponse(status_code=200, content={"connected": True})
+    return FastJSONResponse(
+        status_code=200,
+        content={
+            "connected": True,
+            "recommender": recommender.stats(),
+            "user_cache": known_users.stats(),
+            "interactions": interaction_buffer.stats(),
+            "interaction_index": interaction_index.stats(),
+            "decks": deck_store.stats(),
+            "recommendation_cache": recommendation_cache.stats(),
+            "search_cache": search_cache.stats(),
+            "single_flight": inflight.stats(),
+            "prefetch": prefetcher.stats(),
+            "fallback": fallback.stats(),
+            "mana_overfetch": mana_overfetch.stats(),
+            "seen_cards": seen_cards.stats(),
+            "seen_overfetch": seen_overfetch.stats(),
+        },
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(
+        metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
 
 
 @app.post("/cards")
 async def get_cards(payload: GetCardsPayload):
     try:
-        msg.info(f"Getting cards from user: {payload.userId}")
+        fields = resolve_fields(payload.fields, payload.view)
+        log.info(f"Getting cards from user: {payload.userId}")
 
-        offset = payload.pageSize * (payload.page - 1)
-        card_collection = client.collections.get(os.getenv("COLLECTION_NAME"))
+        # Pages start at 1; anything lower would wrap to the end of the catalog
+        page = max(payload.page, 1)
+        offset = payload.pageSize * (page - 1)
+        await catalog.ensure_loaded()
+        await seen_cards.ready(payload.userId)
 
         selected_mana = payload.selectedMana
         if len(selected_mana) > 0:
-            filters = Filter.by_property("color_identity").contains_all(selected_mana)
-            response = await card_collection.query.fetch_objects(
-                limit=2000,
-                sort=Sort.by_property("name", ascending=True),
-                filters=filters,
-            )
-            random.shuffle(response.objects)
-            response.objects = response.objects[: payload.pageSize]
+            ordinals = catalog.matching(color_mask(selected_mana))
         else:
-            response = await card_collection.query.fetch_objects(
-                limit=payload.pageSize,
-                offset=offset,
-                sort=Sort.by_property("name", ascending=True),
+            ordinals = range(len(catalog))
+
+        # Cards the user already swiped are skipped without shifting later pages
+        skipped = seen_cards.skipped_positions(payload.userId, ordinals)
+        remaining = len(ordinals) - len(skipped)
+        if len(selected_mana) > 0 and remaining > 0:
+            # Pages past the end wrap around, so any page number yields cards
+            number_of_pages = -(-remaining // payload.pageSize)
+            offset = payload.pageSize * ((page - 1) % number_of_pages)
+        card_ids = [
+            catalog.card_ids[ordinals[position]]
+            for position in unseen_positions(
+                offset, payload.pageSize, skipped, len(ordinals)
             )
-
-        cards = [
-            {
-                **card.properties,
-                "card_id": str(card.properties["card_id"]),
-                "oracle_id": str(card.properties["oracle_id"]),
-            }
-            for card in response.objects
         ]
 
-        return JSONResponse(
+        cards = sorted(
+            await fetch_cards(card_ids, fields),
+            key=lambda card: catalog.ordinals.get(card["card_id"], 0),
+        )
+
+        return FastJSONResponse(
             status_code=200,
             content={
-                "cards": cards,
+                "cards": project(cards, fields),
             },
         )
     except Exception as e:
         msg.fail(f"An error occurred: {str(e)}")
-        return JSONResponse(status_code=400, content={"cards": []})
+        return FastJSONResponse(status_code=400, content={"cards": []})
 
 
 @app.post("/card_recommendation")
 async def card_recommendation(payload: CardRecommendationPayload):
     try:
-        msg.info(f"Getting card recommendations from user: {payload.userId}")
-
-        if len(payload.selectedMana) > 0:
-            filters = [
-                FilterConfig(
-                    property_name="color_identity",
-                    operator="ContainsAll",
-                    value=payload.selectedMana,
-                )
-            ]
-        else:
-            filters = None
+        fields = resolve_fields(payload.fields, payload.view)
+        log.info(f"Getting card recommendations from user: {payload.userId}")
+        await seen_cards.ready(payload.userId)
 
         try:
-            if len(payload.cardIds) == 1:
-                recommendations = recommender_client.recommendation.item.from_item(
-                    item_id=payload.cardIds[0],
-                    limit=payload.numberOfCards,
-                    remove_reference=True,
-                    filters=filters,
-                )
-            else:
-                recommendations = recommender_client.recommendation.item.from_items(
-                    item_ids=payload.cardIds,
-                    limit=payload.numberOfCards,
-                    remove_reference=True,
-                    filters=filters,
-                )
+            cards = await get_card_recommendations(
+                payload.cardIds,
+                payload.numberOfCards,
+                payload.selectedMana,
+                payload.userId,
+            )
         except Exception as e:
             msg.fail(f"Recommendation error: {str(e)}")
-            random_card = await get_random_cards(6)
-            return JSONResponse(
+            seen = seen_cards.card_ids(payload.userId)
+            fallback_cards = await get_fallback_cards(
+                fallback.similar(
+                    payload.cardIds,
+                    payload.numberOfCards,
+                    payload.selectedMana,
+                    exclude_ids=seen,
+                ),
+                6,
+                payload.selectedMana,
+                fields,
+                seen,
+            )
+            return FastJSONResponse(
                 status_code=200,
-                content={"cards": random_card, "total": len(random_card)},
+                content={
+                    "cards": project(fallback_cards, fields),
+                    "total": len(fallback_cards),
+                },
             )
 
-        cards = [
-            {
-                **recommendation.properties,
-                "card_id": str(recommendation.properties["card_id"]),
-                "oracle_id": str(recommendation.properties["oracle_id"]),
-            }
-            for recommendation in recommendations.recommendations
-        ]
-
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content={
-                "cards": cards,
+                "cards": project(cards, fields),
                 "total": len(cards),
             },
         )
     except Exception as e:
         msg.fail(f"An error occurred: {str(e)}")
-        return JSONResponse(status_code=400, content={"cards": [], "total": 0})
+        return FastJSONResponse(status_code=400, content={"cards": [], "total": 0})
 
 
 @app.post("/card_search")
 async def card_search(payload: SearchCardsPayload):
     try:
+        fields = resolve_fields(payload.fields, payload.view)
+        await seen_cards.ready(payload.userId)
 
         try:
 
-            influence_factor = 0
-            total_interactions = (
-                payload.numberOfInteractions / 2
-            ) + payload.numberOfDeck
-            influence_factor = max(min(total_interactions / 100, 0.8), 0)
-
-            if payload.numberOfInteractions < 5:
-                influence_factor = 0
+            influence_factor = get_influence_factor(
+                payload.numberOfInteractions, payload.numberOfDeck
+            )
 
-            msg.info(
+            log.info(
                 f"Searching for cards with query: {payload.query} for user: {payload.userId} with influence factor: {influence_factor} and search type: {payload.searchType}"
             )
 
-            if len(payload.selectedMana) > 0:
-                filters = [
-                    FilterConfig(
-                        property_name="color_identity",
-                        operator="ContainsAll",
-                        value=payload.selectedMana,
-                    )
-                ]
-            else:
-                filters = None
-
-            search_results = recommender_client.search(
-                text=payload.query,
-                user_id=payload.userId,
-                limit=payload.numberOfCards,
-                influence_factor=influence_factor,
-                filters=filters,
+            cards = await search_cards(
+                payload.query,
+                payload.userId,
+                payload.numberOfCards,
+                influence_factor,
+                payload.selectedMana,
             )
 
         except Exception as e:
             msg.fail(f"Search error: {str(e)}")
-            random_card = await get_random_cards(6)
-            return JSONResponse(
+            seen = seen_cards.card_ids(payload.userId)
+            fallback_cards = await get_fallback_cards(
+                fallback.search(
+                    payload.query,
+                    payload.numberOfCards,
+                    payload.selectedMana,
+                    exclude_ids=seen,
+                ),
+                6,
+                payload.selectedMana,
+                fields,
+                seen,
+            )
+            return FastJSONResponse(
                 status_code=200,
-                content={"cards": random_card, "total": len(random_card)},
+                content={
+                    "cards": project(fallback_cards, fields),
+                    "total": len(fallback_cards),
+                },
             )
 
-        cards = [
-            {
-                **recommendation.properties,
-                "card_id": str(recommendation.properties["card_id"]),
-                "oracle_id": str(recommendation.properties["oracle_id"]),
-            }
-            for recommendation in search_results.results
-        ]
-
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content={
-                "cards": cards,
+                "cards": project(cards, fields),
                 "total": len(cards),
             },
         )
     except Exception as e:
         msg.fail(f"An error occurred: {str(e)}")
-        return JSONResponse(status_code=400, content={"cards": [], "total": 0})
+        return FastJSONResponse(status_code=400, content={"cards": [], "total": 0})
 
 
 @app.post("/user_recommendation")
 async def user_recommendation(payload: UserRecommendationPayload):
     try:
-        msg.info(f"Getting user recommendations for user: {payload.userId}")
-
-        if len(payload.selectedMana) > 0:
-            filters = [
-                FilterConfig(
-                    property_name="color_identity",
-                    operator="ContainsAll",
-                    value=payload.selectedMana,
-                )
-            ]
-        else:
-            filters = None
+        fields = resolve_fields(payload.fields, payload.view)
+        log.info(f"Getting user recommendations for user: {payload.userId}")
+        await seen_cards.ready(payload.userId)
 
         try:
-            recommendations = recommender_client.recommendation.item.from_user(
-                user_id=payload.userId,
-                limit=payload.numberOfCards,
-                remove_reference=True,
-                top_n_interactions=100,
+            cards = await next_user_recommendations(
+                payload.userId, payload.numberOfCards, payload.selectedMana
             )
         except Exception as e:
             msg.fail(f"Recommendation error: {str(e)}")
-            random_card = await get_random_cards(1)
-            return JSONResponse(
+            await seed_fallback(payload.userId)
+            seen = seen_cards.card_ids(payload.userId)
+            fallback_cards = await get_fallback_cards(
+                fallback.for_user(
+                    payload.userId,
+                    payload.numberOfCards,
+                    payload.selectedMana,
+                    exclude_ids=seen,
+                ),
+                1,
+                payload.selectedMana,
+                fields,
+                seen,
+            )
+            return FastJSONResponse(
                 status_code=200,
-                content={"cards": random_card, "total": 1},
+                content={
+                    "cards": project(fallback_cards, fields),
+                    "total": len(fallback_cards),
+                },
             )
 
-        cards = [
-            {
-                **recommendation.properties,
-                "card_id": str(recommendation.properties["card_id"]),
-                "oracle_id": str(recommendation.properties["oracle_id"]),
-            }
-            for recommendation in recommendations.recommendations
-        ]
-
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content={
-                "cards": cards,
+                "cards": project(cards, fields),
                 "total": len(cards),
             },
         )
     except Exception as e:
         msg.fail(f"An error occurred: {str(e)}")
-        return JSONResponse(status_code=400, content={"cards": [], "total": 0})
+        return FastJSONResponse(status_code=400, content={"cards": [], "total": 0})
+
+
+@app.post("/recommendations/batch")
+async def batch_recommendations(payload: BatchRecommendationPayload):
+    try:
+        log.info(
+            f"Running {len(payload.requests)} batched requests for user: {payload.userId}"
+        )
+
+        if len(payload.requests) > batch_max_requests:
+            msg.warn(f"Too many batched requests: {len(payload.requests)}")
+            return FastJSONResponse(status_code=400, content={"results": []})
+
+        await seen_cards.ready(payload.userId)
+
+        # Every sub-request shares one deadline; whatever misses it is reported as such
+        fields = [
+            resolve_fields(request.fields, request.view) for request in payload.requests
+        ]
+        tasks = [
+            asyncio.create_task(
+                run_batch_request(payload.userId, request, request_fields)
+            )
+            for request, request_fields in zip(payload.requests, fields)
+        ]
+        pending = set()
+        if tasks:
+            _, pending = await asyncio.wait(
+                tasks, timeout=min(payload.timeout, batch_max_timeout)
+            )
+        for task in pending:
+            task.cancel()
+
+        results = []
+        for request, request_fields, task in zip(payload.requests, fields, tasks):
+            result = {"id": request.id, "cards": [], "total": 0, "error": None}
+            if task in pending or task.cancelled():
+                result["error"] = "timeout"
+            elif task.exception() is not None:
+                msg.fail(f"Batched {request.type} error: {str(task.exception())}")
+                result["error"] = str(task.exception())
+            else:
+                cards = task.result()
+                result["cards"] = project(cards, request_fields)
+                result["total"] = len(cards)
+            results.append(result)
+
+        return FastJSONResponse(status_code=200, content={"results": results})
+    except Exception as e:
+        msg.fail(f"An error occurred: {str(e)}")
+        return FastJSONResponse(status_code=400, content={"results": []})
 
 
 @app.post("/add_interaction")
 async def add_interaction(payload: AddInteractionPayload):
     try:
-        msg.info(
+        log.info(
             f"Adding interaction for user: {payload.userId} and card: {payload.cardId} | {payload.interaction}"
         )
 
-        await user_check(payload.userId)
-
-        response = recommender_client.user.add_interaction(
-            user_id=payload.userId,
-            item_id=payload.cardId,
-            interaction_property_name=payload.interaction,
-            weight=payload.weight,
+        interaction_buffer.add(
+            payload.userId, payload.cardId, payload.interaction, payload.weight
         )
+        interaction_index.append(
+            payload.userId, payload.cardId, payload.interaction, payload.weight
+        )
+        invalidate_user_results(payload.userId)
+        prefetcher.mark_seen(payload.userId, payload.cardId)
+        seen_cards.add(payload.userId, [payload.cardId])
+        fallback.record(payload.userId, payload.cardId, payload.weight)
 
-        msg.good(f"Interaction added: {response}")
-
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content=None,
         )
+    except InteractionBufferFullError as e:
+        msg.fail(f"An error occurred: {str(e)}")
+        return FastJSONResponse(status_code=503, content=None)
     except Exception as e:
         msg.fail(f"An error occurred: {str(e)}")
-        return JSONResponse(status_code=400, content=None)
+        return FastJSONResponse(status_code=400, content=None)
 
 
 @app.post("/get_interactions")
-async def get_interactions(payload: GetInteractionsPayload):
+async def get_interactions(payload: InteractionsPagePayload):
     try:
-        msg.info(f"Getting interactions for user: {payload.userId}")
+        log.info(f"Getting interactions for user: {payload.userId}")
 
         await user_check(payload.userId)
+        paged = payload.limit is not None or payload.since is not None
 
         try:
-
-            start_time = time.time()
-
-            response = recommender_client.user.get_user_interactions(payload.userId)
-
-            end_time = time.time()
-            msg.info(
-                f"Time taken to get interactions for user {payload.userId}: {end_time - start_time} seconds"
-            )
+            history = await interaction_index.history(payload.userId)
         except Exception as e:
             msg.fail(f"An error when getting interactions: {str(e)}")
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=200,
-                content=[],
+                content=(
+                    {
+                        "interactions": [],
+                        "cursor": payload.since,
+                        "hasMore": False,
+                        "reset": False,
+                    }
+                    if paged
+                    else []
+                ),
             )
 
-        item_ids = set([interaction.item_id for interaction in response])
-        card_info = await get_image_uris(item_ids)
+        entries, cursor, has_more, reset = interaction_index.page(
+            history, payload.since, payload.limit
+        )
+        # Only the cards on this page, mostly straight from the catalog
+        card_info = await get_image_uris({item_id for item_id, _, _ in entries})
         interactions = []
-        for interaction in response:
+        for item_id, interaction, weight in entries:
+            info = card_info.get(item_id, {})
             interactions.append(
                 {
-                    "item_id": interaction.item_id,
-                    "name": card_info[interaction.item_id]["name"],
-                    "interaction_property_name": interaction.interaction_property_name,
-                    "weight": interaction.weight,
-                    "image_uri": card_info[interaction.item_id]["image_uri"],
+                    "item_id": item_id,
+                    "name": info.get("name"),
+                    "interaction_property_name": interaction,
+                    "weight": weight,
+                    "image_uri": info.get("image_uri"),
                 }
             )
 
-        return JSONResponse(
+        if not paged:
+            return FastJSONResponse(status_code=200, content=interactions)
+        return FastJSONResponse(
             status_code=200,
-            content=interactions,
+            content={
+                "interactions": interactions,
+                "cursor": cursor,
+                "hasMore": has_more,
+                "reset": reset,
+            },
         )
     except Exception as e:
         msg.fail(f"An error occurred: {str(e)}")
-        return JSONResponse(status_code=400, content=None)
+        return FastJSONResponse(status_code=400, content=None)
 
 
 @app.post("/delete_all_interactions")
 async def delete_all_interactions(payload: GetInteractionsPayload):
     try:
-        msg.info(f"Deleting all interactions for user: {payload.userId}")
+        log.info(f"Deleting all interactions for user: {payload.userId}")
 
         await user_check(payload.userId)
+        # Also waits for a write in progress, so nothing lands after the delete
+        await interaction_buffer.discard(payload.userId)
+        invalidate_user_results(payload.userId)
+        prefetcher.discard(payload.userId)
+        fallback.discard(payload.userId)
+        seen_cards.discard(payload.userId)
+        interaction_index.reset(payload.userId)
 
         try:
-            response = recommender_client.user.delete_all_interactions(payload.userId)
-            msg.info(f"Interactions deleted: {response}")
+            response = await recommender.run(
+                recommender_client.user.delete_all_interactions, payload.userId
+            )
+            log.info(f"Interactions deleted: {response}")
         except Exception as e:
+            # What is left upstream is unknown, so reload it on next use
+            interaction_index.discard(payload.userId)
             msg.fail(f"An error when getting interactions: {str(e)}")
-            return JSONResponse(
+            return FastJSONResponse(
                 status_code=500,
                 content=None,
             )
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content=None,
         )
 
     except Exception as e:
         msg.fail(f"An error occurred: {str(e)}")
-        return JSONResponse(status_code=400, content=None)
+        return FastJSONResponse(status_code=400, content=None)
 
 
 @app.post("/save_deck")
 async def save_deck(payload: SaveDeckPayload):
     try:
-        msg.info(f"Saving deck for user: {payload.userId}")
+        log.info(f"Saving deck for user: {payload.userId}")
 
-        await user_check(payload.userId)
-
-        updated_user = User(
-            id=payload.userId, properties={"decks": payload.deck_string}
-        )
-        response = recommender_client.user.update_user(updated_user)
-        msg.good(f"Deck saved: {response}")
+        # Accepts both the compact and the full JSON form
+        deck_store.replace(payload.userId, decode_deck(payload.deck_string))
 
-        return JSONResponse(
+        return FastJSONResponse(
             status_code=200,
             content=None,
         )
     except Exception as e:
         msg.fail(f"An error when saving deck for user: {payload.userId}: {str(e)}")
-        return JSONResponse(status_code=500, content=None)
+        return FastJSONResponse(status_code=500, content=None)
+
+
+@app.post("/update_deck")
+async def update_deck(payload: UpdateDeckPayload):
+    try:
+        log.info(f"Updating deck for user: {payload.userId}")
+
+        deck = await deck_store.apply(
+            payload.userId,
+            [(change.cardId, change.quantity) for change in payload.changes],
+        )
+
+        return FastJSONResponse(
+            status_code=200,
+            content={
+                "deck": [
+                    {"card_id": card_id, "quantity": quantity}
+                    for card_id, quantity in deck.items()
+                ]
+            },
+        )
+    except Exception as e:
+        msg.fail(f"An error when updating deck for user: {payload.userId}: {str(e)}")
+        return FastJSONResponse(status_code=500, content=None)
 
 
 @app.post("/get_deck")
 async def get_deck(payload: GetInteractionsPayload):
     try:
-        start_time = time.time()
-        msg.info(f"Getting deck for user: {payload.userId}")
+        log.info(f"Getting deck for user: {payload.userId}")
 
-        await user_check(payload.userId)
+        deck = await deck_store.get(payload.userId)
+        cards = await fetch_cards(list(deck), CARD_VIEWS["thumbnail"])
 
-        user = recommender_client.user.get_user(payload.userId)
-        end_time = time.time()
-        msg.info(
-            f"Time taken to get deck for user {payload.userId}: {end_time - start_time} seconds"
-        )
+        by_id = {card["card_id"]: card for card in cards}
 
-        return JSONResponse(
+        # Still the JSON string of [{card_type, quantity}] the frontend parses,
+        # but card_type only carries the thumbnail fields
+        return FastJSONResponse(
             status_code=200,
-            content=user.properties["decks"],
+            content=dumps(
+                [
+                    {"card_type": by_id[card_id], "quantity": quantity}
+                    for card_id, quantity in deck.items()
+                    if card_id in by_id
+                ]
+            ).decode("utf-8"),
         )
     except Exception as e:
         msg.fail(f"An error when getting deck: {str(e)}")
-        return JSONResponse(status_code=500, content=None)
+        return FastJSONResponse(status_code=500, content=None)
 
 
-async def get_random_cards(num_cards: int = 1):
-    card_collection = client.collections.get(os.getenv("COLLECTION_NAME"))
+def get_mana_filters(selected_mana: list[str]):
+    if len(selected_mana) > 0:
+        return [
+            FilterConfig(
+                property_name="color_identity",
+                operator="ContainsAll",
+                value=selected_mana,
+            )
+        ]
+    return None
+
+
+def get_influence_factor(number_of_interactions: int, number_of_deck: int) -> float:
+    if number_of_interactions < 5:
+        return 0
+    total_interactions = (number_of_interactions / 2) + number_of_deck
+    return max(min(total_interactions / 100, 0.8), 0)
+
+
+async def get_card_recommendations(
+    card_ids: list[str],
+    limit: int,
+    selected_mana: list[str],
+    user_id: str | None = None,
+):
+    exclude = seen_cards.excluder(user_id) if user_id else None
+    if exclude is None:
+        return await fetch_card_recommendations(card_ids, limit, selected_mana)
+    # Cards the user already swiped are dropped and made up for by overfetching
+    return await seen_overfetch.fetch(
+        0,
+        limit,
+        lambda n: fetch_card_recommendations(card_ids, n, selected_mana),
+        exclude,
+    )
+
+
+async def fetch_card_recommendations(
+    card_ids: list[str], limit: int, selected_mana: list[str]
+):
+    key = (
+        "from_items",
+        tuple(sorted(card_ids)),
+        tuple(sorted(selected_mana)),
+        limit,
+    )
+    filters = get_mana_filters(selected_mana)
+    return await recommendation_cache.get_or_compute(
+        key,
+        lambda: inflight.do(key, lambda: recommend_cards(card_ids, limit, filters)),
+    )
+
+
+async def search_cards(
+    query: str,
+    user_id: str,
+    limit: int,
+    influence_factor: float,
+    selected_mana: list[str],
+):
+    exclude = seen_cards.excluder(user_id)
+    if exclude is None:
+        return await fetch_search_results(
+            query, user_id, limit, influence_factor, selected_mana
+        )
+    return await seen_overfetch.fetch(
+        0,
+        limit,
+        lambda n: fetch_search_results(
+            query, user_id, n, influence_factor, selected_mana
+        ),
+        exclude,
+    )
+
+
+async def fetch_search_results(
+    query: str,
+    user_id: str,
+    limit: int,
+    influence_factor: float,
+    selected_mana: list[str],
+):
+    query = " ".join(query.split())
+    filters = get_mana_filters(selected_mana)
+    # Without influence the results do not depend on the user
+    tag = user_id if influence_factor > 0 else None
+    key = (
+        "search",
+        query.casefold(),
+        tag,
+        limit,
+        influence_factor,
+        tuple(sorted(selected_mana)),
+    )
+    return await search_cache.get_or_compute(
+        key,
+        lambda: inflight.do(
+            key,
+            lambda: run_search(query, user_id, limit, influence_factor, filters),
+        ),
+        tag=tag,
+    )
+
+
+async def run_search(
+    query: str, user_id: str, limit: int, influence_factor: float, filters
+):
+    search_results = await recommender.run(
+        recommender_client.search,
+        text=query,
+        user_id=user_id,
+        limit=limit,
+        influence_factor=influence_factor,
+        filters=filters,
+    )
+    return cards_from_objects(search_results.results)
+
+
+async def next_user_recommendations(
+    user_id: str, limit: int, selected_mana: list[str] | None = None
+):
+    # Prefetched cards first; the recommender only for what the queue lacks
+    cards = prefetcher.take(user_id, limit, color_mask(selected_mana or []))
+    if len(cards) < limit:
+        taken = {card["card_id"] for card in cards}
+        fetched = [
+            card
+            for card in await get_user_recommendations(user_id, limit, selected_mana)
+            if card["card_id"] not in taken
+        ][: limit - len(cards)]
+        prefetcher.served(user_id, fetched)
+        cards += fetched
+    return cards
 
-    aggregation_response = await card_collection.aggregate.over_all(total_count=True)
 
-    if aggregation_response.total_count == 0:
-        msg.warn("No cards found")
+async def get_user_recommendations(
+    user_id: str, limit: int, selected_mana: list[str] | None = None
+):
+    return await fetch_user_cards(user_id, limit, color_mask(selected_mana or []))
+
+
+async def fetch_user_cards(user_id: str, limit: int, required: int):
+    exclude = seen_cards.excluder(user_id)
+    if not required and exclude is None:
+        return await fetch_user_recommendations(user_id, limit)
+    return await mana_overfetch.fetch(
+        required,
+        limit,
+        lambda n: fetch_user_recommendations(user_id, n),
+        exclude,
+    )
+
+
+async def fetch_user_recommendations(user_id: str, limit: int):
+    recommendations = await inflight.do(
+        ("from_user", user_id, limit),
+        lambda: recommender.run(
+            recommender_client.recommendation.item.from_user,
+            user_id=user_id,
+            limit=limit,
+            remove_reference=True,
+            top_n_interactions=100,
+        ),
+    )
+    return cards_from_objects(recommendations.recommendations)
+
+
+async def run_batch_request(
+    user_id: str, request: BatchRequest, fields: list[str] | None
+):
+    try:
+        if request.type in ("from_item", "from_items"):
+            return await get_card_recommendations(
+                request.cardIds, request.numberOfCards, request.selectedMana, user_id
+            )
+        if request.type == "from_user":
+            return await next_user_recommendations(
+                user_id, request.numberOfCards, request.selectedMana
+            )
+        return await search_cards(
+            request.query,
+            user_id,
+            request.numberOfCards,
+            get_influence_factor(request.numberOfInteractions, request.numberOfDeck),
+            request.selectedMana,
+        )
+    except Exception as e:
+        # Same local fallback as the single endpoints
+        msg.fail(f"Batched {request.type} error: {str(e)}")
+        seen = seen_cards.card_ids(user_id)
+        if request.type in ("from_item", "from_items"):
+            ranked_ids = fallback.similar(
+                request.cardIds,
+                request.numberOfCards,
+                request.selectedMana,
+                exclude_ids=seen,
+            )
+            num_random = 6
+        elif request.type == "from_user":
+            await seed_fallback(user_id)
+            ranked_ids = fallback.for_user(
+                user_id, request.numberOfCards, request.selectedMana, exclude_ids=seen
+            )
+            num_random = 1
+        else:
+            ranked_ids = fallback.search(
+                request.query,
+                request.numberOfCards,
+                request.selectedMana,
+                exclude_ids=seen,
+            )
+            num_random = 6
+        return await get_fallback_cards(
+            ranked_ids, num_random, request.selectedMana, fields, seen
+        )
+
+
+async def recommend_cards(card_ids: list[str], limit: int, filters):
+    if len(card_ids) == 1:
+        recommendations = await recommender.run(
+            recommender_client.recommendation.item.from_item,
+            item_id=card_ids[0],
+            limit=limit,
+            remove_reference=True,
+            filters=filters,
+        )
+    else:
+        recommendations = await recommender.run(
+            recommender_client.recommendation.item.from_items,
+            item_ids=card_ids,
+            limit=limit,
+            remove_reference=True,
+            filters=filters,
+        )
+
+    return cards_from_objects(recommendations.recommendations)
+
+
+async def watch_training():
+    while True:
+        try:
+            status = await recommender.run(recommender_client.train_status)
+            model_version = get_model_version(status)
+            if model_version is not None:
+                recommendation_cache.set_model_version(model_version)
+                search_cache.set_model_version(model_version)
+        except Exception as e:
+            msg.fail(f"An error occurred when checking training status: {str(e)}")
+        await asyncio.sleep(training_check_interval)
+
+
+def get_model_version(status):
+    # Prefer anything that identifies the trained model itself; the status
+    # string alone misses a retrain that starts and ends between two polls
+    for name in MODEL_VERSION_FIELDS:
+        value = getattr(status, name, None)
+        if value is not None:
+            return (name, str(value))
+    status_text = getattr(status, "status", None)
+    return None if status_text is None else ("status", str(status_text))
+
+
+async def fetch_cards(card_ids: list[str], fields: list[str] | None = None):
+    if not card_ids:
         return []
 
-    cards = []
-    for _ in range(num_cards):
-        offset = random.randint(0, aggregation_response.total_count - 1)
-        response = await card_collection.query.fetch_objects(
-            limit=1,
-            offset=offset,
+    # Views the catalog can fully answer need no Weaviate call at all
+    if fields and set(fields) <= set(CATALOG_PROPERTIES):
+        cards = catalog.cards(card_ids)
+        if cards is not None:
+            return cards
+
+    return await inflight.do(
+        ("fetch_objects_by_ids", tuple(sorted(card_ids)), tuple(fields or ())),
+        lambda: query_cards_by_ids(card_ids, fields),
+    )
+
+
+async def query_cards_by_ids(card_ids: list[str], fields: list[str] | None = None):
+    card_collection = client.collections.get(os.getenv("COLLECTION_NAME"))
+    with metrics.span("weaviate", "fetch_objects_by_ids"):
+        response = await card_collection.query.fetch_objects_by_ids(
+            card_ids, limit=len(card_ids), return_properties=fields
+        )
+
+    return cards_from_objects(response.objects)
+
+
+sampler = RandomCardSampler(
+    catalog,
+    fetch_cards,
+    pool_size=int(os.getenv("RANDOM_POOL_SIZE", 60)),
+)
+
+
+async def get_random_cards(
+    num_cards: int = 1, color_identity: list[str] = None, exclude: set[str] = None
+):
+    return await sampler.sample(num_cards, color_identity, exclude)
+
+
+async def seed_fallback(user_id: str):
+    # After a restart the fallback has no swipes of its own for the user yet
+    if fallback.knows(user_id):
+        return
+    try:
+        history = await asyncio.wait_for(
+            interaction_index.history(user_id), fallback_history_timeout
         )
+        interactions = [(item_id, weight) for item_id, _, weight in history.entries]
+    except Exception as e:
+        # The upstream history is often down along with the recommendations
+        msg.warn(f"Seeding fallback from buffered interactions only: {str(e)}")
+        interactions = [
+            (entry["item_id"], entry["weight"])
+            for entry in interaction_buffer.pending_for(user_id)
+        ]
+    if interactions:
+        fallback.seed(user_id, interactions)
+
+
+async def get_fallback_cards(
+    ranked_ids: list[str] | None,
+    num_random: int,
+    selected_mana: list[str],
+    fields: list[str] | None = None,
+    exclude: set[str] | None = None,
+):
+    # Random cards only when the local index has nothing to offer
+    if not ranked_ids:
+        metrics.increment("fallback_responses_total", source="random")
+        return await get_random_cards(num_random, selected_mana, exclude)
+
+    metrics.increment("fallback_responses_total", source="local")
+    rank = {card_id: i for i, card_id in enumerate(ranked_ids)}
+    cards = await fetch_cards(ranked_ids, fields)
+    return sorted(cards, key=lambda card: rank.get(card["card_id"], 0))
+
+
+async def load_interaction_history(user_id: str) -> list[tuple]:
+    # Interactions still waiting in the buffer have not reached the recommender
+    # yet; holding the user's writes keeps any from moving across meanwhile
+    async with interaction_buffer.hold(user_id):
+        interactions = await recommender.run(
+            recommender_client.user.get_user_interactions, user_id
+        )
+        pending = interaction_buffer.pending_for(user_id)
+    return [
+        (
+            interaction.item_id,
+            interaction.interaction_property_name,
+            interaction.weight,
+        )
+        for interaction in interactions
+    ] + [
+        (
+            interaction["item_id"],
+            interaction["interaction_property_name"],
+            interaction["weight"],
+        )
+        for interaction in pending
+    ]
 
-        if response.objects:
-            card = response.objects[0]
-            cards.append(
-                {
-                    **card.properties,
-                    "card_id": str(card.properties["card_id"]),
-                    "oracle_id": str(card.properties["oracle_id"]),
-                }
-            )
 
-    return cards
+async def load_seen_history(user_id: str) -> list[str]:
+    history = await interaction_index.history(user_id)
+    return [item_id for item_id, _, _ in history.entries]
+
+
+async def flush_interactions(user_id: str, batch: InteractionBatch):
+    await user_check(user_id)
+    await recommender.run(add_interactions, user_id, batch)
+
+
+def interactions_flushed(user_id: str, count: int):
+    # Searches made while these were buffered did not see them yet
+    invalidate_user_results(user_id)
+    prefetcher.refresh(user_id)
+    log.good(f"Interactions added for user {user_id}: {count}")
+
+
+def add_interactions(user_id: str, batch: InteractionBatch):
+    # Runs on a recommender worker, one pool slot per chunk
+    batch.send(
+        lambda interaction: recommender_client.user.add_interaction(
+            user_id=user_id,
+            item_id=interaction["item_id"],
+            interaction_property_name=interaction["interaction_property_name"],
+            weight=interaction["weight"],
+        )
+    )
+
+
+async def load_deck(user_id: str) -> str | None:
+    await user_check(user_id)
+    user = await recommender.run(recommender_client.user.get_user, user_id)
+    return user.properties.get("decks")
+
+
+async def store_deck(user_id: str, deck_string: str):
+    await user_check(user_id)
+    updated_user = User(id=user_id, properties={"decks": deck_string})
+    await recommender.run(recommender_client.user.update_user, updated_user)
+    invalidate_user_results(user_id)
+    log.good(f"Deck saved for user {user_id}: {len(deck_string)} characters")
+
+
+def invalidate_user_results(user_id: str):
+    search_cache.discard_tag(user_id)
 
 
 async def user_check(user_id: str):
-    start_time = time.time()
     try:
-        if not recommender_client.user.exists(user_id):
-            new_user = User(id=user_id, properties={"decks": ""})
-            response = recommender_client.user.create_user(new_user)
-            msg.info(f"User created: {response}")
-        else:
-            msg.info(f"User {user_id} exists")
+        await known_users.ensure(user_id, ensure_user)
     except Exception as e:
         msg.fail(f"An error occurred when creating user: {str(e)}")
-    end_time = time.time()
-    msg.info(f"Time taken for user check: {end_time - start_time} seconds")
+
+
+async def ensure_user(user_id: str):
+    if not await recommender.run(recommender_client.user.exists, user_id):
+        new_user = User(id=user_id, properties={"decks": ""})
+        response = await recommender.run(recommender_client.user.create_user, new_user)
+        log.info(f"User created: {response}")
+    else:
+        log.info(f"User {user_id} exists")
 
 
 async def get_image_uris(card_ids: list[str]):
-    start_time = time.time()
     try:
-        card_collection = client.collections.get(os.getenv("COLLECTION_NAME"))
-        response = await card_collection.query.fetch_objects_by_ids(
-            card_ids, limit=len(card_ids)
-        )
+        await catalog.ensure_loaded()
+
         card_info = {}
+        missing_ids = []
+        for card_id in card_ids:
+            info = catalog.get(card_id)
+            if info is None:
+                missing_ids.append(card_id)
+            else:
+                card_info[card_id] = info
+
+        if not missing_ids:
+            return card_info
+
+        # Cards ingested after the catalog was loaded
+        card_collection = client.collections.get(os.getenv("COLLECTION_NAME"))
+        with metrics.span("weaviate", "fetch_objects_by_ids"):
+            response = await card_collection.query.fetch_objects_by_ids(
+                missing_ids, limit=len(missing_ids)
+            )
         for object in response.objects:
             card_info[str(object.properties["card_id"])] = {
                 "image_uri": object.properties["image_uri"],
                 "name": object.properties["name"],
             }
 
-        end_time = time.time()
-        msg.info(f"Time taken to fetch image URIs: {end_time - start_time} seconds")
         return card_info
     except Exception as e:
         msg.fail(f"An error occurred while fetching image URI: {str(e)}")
-        end_time = time.time()
-        msg.info(f"Time taken to fetch image URIs: {end_time - start_time} seconds")
         return {}
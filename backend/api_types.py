@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Literal
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 
 class AddInteractionPayload(BaseModel):
@@ -13,11 +13,27 @@ class GetInteractionsPayload(BaseModel):
     userId: str
 
 
+class InteractionsPagePayload(BaseModel):
+    userId: str
+    limit: Optional[int] = None
+    since: Optional[str] = None
+
+
 class SaveDeckPayload(BaseModel):
     userId: str
     deck_string: str
 
 
+class DeckChange(BaseModel):
+    cardId: str
+    quantity: int
+
+
+class UpdateDeckPayload(BaseModel):
+    userId: str
+    changes: List[DeckChange]
+
+
 class SearchCardsPayload(BaseModel):
     query: str
     userId: str
@@ -26,13 +42,17 @@ class SearchCardsPayload(BaseModel):
     numberOfDeck: int
     searchType: Literal["recommended", "hybrid"]
     selectedMana: List[str]
+    fields: Optional[List[str]] = None
+    view: Optional[Literal["thumbnail", "detail"]] = None
 
 
 class GetCardsPayload(BaseModel):
-    pageSize: int
+    pageSize: int = Field(gt=0)
     page: int
     userId: str
     selectedMana: List[str]
+    fields: Optional[List[str]] = None
+    view: Optional[Literal["thumbnail", "detail"]] = None
 
 
 class CardRecommendationPayload(BaseModel):
@@ -40,9 +60,32 @@ class CardRecommendationPayload(BaseModel):
     cardIds: List[str]
     userId: str
     selectedMana: List[str]
+    fields: Optional[List[str]] = None
+    view: Optional[Literal["thumbnail", "detail"]] = None
 
 
 class UserRecommendationPayload(BaseModel):
     numberOfCards: int
     userId: str
     selectedMana: List[str]
+    fields: Optional[List[str]] = None
+    view: Optional[Literal["thumbnail", "detail"]] = None
+
+
+class BatchRequest(BaseModel):
+    type: Literal["from_item", "from_items", "from_user", "search"]
+    id: Optional[str] = None
+    numberOfCards: int
+    cardIds: List[str] = []
+    query: str = ""
+    numberOfInteractions: int = 0
+    numberOfDeck: int = 0
+    selectedMana: List[str] = []
+    fields: Optional[List[str]] = None
+    view: Optional[Literal["thumbnail", "detail"]] = None
+
+
+class BatchRecommendationPayload(BaseModel):
+    userId: str
+    requests: List[BatchRequest]
+    timeout: float = 5.0
@@ -0,0 +1,9 @@
+import asyncio
+
+
+async def cancel_tasks(tasks):
+    """Cancel background tasks and wait until every one of them has finished."""
+    tasks = [task for task in tasks if task is not None and not task.done()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,223 @@
+"""Microbenchmark for card normalization, before and after card_records.
+
+Also times a NumPy-backed columnar batch, the design card_records was
+measured against (see the note at the top of card_records.py).
+
+Run from the repository root:
+
+    python -m backend.benchmarks.card_records --cards 1000 --repeat 20
+"""
+
+import argparse
+import timeit
+import uuid
+from itertools import repeat
+from operator import itemgetter
+
+import numpy as np
+
+from ..card_records import (
+    CARD_PROPERTIES,
+    UUID_PROPERTIES,
+    normalize_properties,
+    normalize_scryfall,
+)
+
+NUMERIC_PROPERTIES = ("edhrec_rank", "cmc")
+LIST_PROPERTIES = ("colors", "color_identity", "keywords", "produced_mana")
+uuid_strings: dict = {}
+
+
+def make_scryfall_records(count: int) -> list[dict]:
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "oracle_id": str(uuid.uuid4()),
+            "name": f"Card {i}",
+            "released_at": "2024-01-01",
+            "uri": f"https://api.scryfall.com/cards/{i}",
+            "scryfall_uri": f"https://scryfall.com/card/{i}",
+            "image_uris": {"normal": f"https://cards.scryfall.io/normal/{i}.jpg"},
+            "type_line": "Creature — Elf Druid",
+            "oracle_text": "{T}: Add {G}. " * 4,
+            "colors": ["G"],
+            "color_identity": ["G"],
+            "keywords": [],
+            "produced_mana": ["G"],
+            "set_name": "Benchmark",
+            "rarity": "common",
+            "power": "1",
+            "toughness": "1",
+            "mana_cost": "{G}",
+            "cmc": 1,
+            "edhrec_rank": i,
+        }
+        for i in range(count)
+    ]
+
+
+def per_card_scryfall(records: list[dict]) -> list[dict]:
+    # What add_items.py did for every card before card_records
+    return [
+        {
+            "card_id": card["id"],
+            "oracle_id": card.get("oracle_id", ""),
+            "name": card["name"],
+            "released_at": card.get("released_at", ""),
+            "uri": card["uri"],
+            "scryfall_uri": card["scryfall_uri"],
+            "image_uri": (card["image_uris"]["normal"] if "image_uris" in card else ""),
+            "type_line": card.get("type_line", ""),
+            "oracle_text": card.get("oracle_text", ""),
+            "colors": card.get("colors", []),
+            "color_identity": card.get("color_identity", []),
+            "keywords": card.get("keywords", []),
+            "produced_mana": card.get("produced_mana", []),
+            "set_name": card.get("set_name", ""),
+            "rarity": card.get("rarity", ""),
+            "power": card.get("power", ""),
+            "toughness": card.get("toughness", ""),
+            "mana_cost": card.get("mana_cost", ""),
+            "loyalty": card.get("loyalty", ""),
+            "defense": card.get("defense", ""),
+            "life_modifier": card.get("life_modifier", ""),
+            "hand_modifier": card.get("hand_modifier", ""),
+            "edhrec_rank": card.get("edhrec_rank", 0),
+            "cmc": card.get("cmc", 0),
+        }
+        for card in records
+    ]
+
+
+def per_card_response(properties: list[dict]) -> list[dict]:
+    # What every endpoint in api.py did before card_records
+    return [
+        {
+            **card,
+            "card_id": str(card["card_id"]),
+            "oracle_id": str(card["oracle_id"]),
+        }
+        for card in properties
+    ]
+
+
+def stored_properties(records: list[dict]) -> list[dict]:
+    # Weaviate hands UUID properties back as uuid.UUID
+    properties = per_card_scryfall(records)
+    for card in properties:
+        card["card_id"] = uuid.UUID(card["card_id"])
+        card["oracle_id"] = uuid.UUID(card["oracle_id"])
+    return properties
+
+
+def columnar_rows(columns: dict) -> list[dict]:
+    # Consumers (RecommenderItem, orjson) take one dict per card
+    keys = list(columns)
+    values = [
+        column.tolist() if isinstance(column, np.ndarray) else column
+        for column in columns.values()
+    ]
+    return list(map(dict, map(zip, repeat(keys), zip(*values))))
+
+
+def columnar_scryfall(records: list[dict]) -> list[dict]:
+    # One typed column per property, malformed records masked out
+    columns = {
+        "card_id": [card.get("id") for card in records],
+        "oracle_id": [card.get("oracle_id", "") for card in records],
+        "name": [card.get("name") for card in records],
+        "released_at": [card.get("released_at", "") for card in records],
+        "uri": [card.get("uri") for card in records],
+        "scryfall_uri": [card.get("scryfall_uri") for card in records],
+        "image_uri": [
+            card["image_uris"].get("normal", "") if "image_uris" in card else ""
+            for card in records
+        ],
+    }
+    for name in CARD_PROPERTIES:
+        if name not in columns and name not in NUMERIC_PROPERTIES:
+            default = [] if name in LIST_PROPERTIES else ""
+            columns[name] = [card.get(name, default) for card in records]
+    for name in NUMERIC_PROPERTIES:
+        columns[name] = np.asarray([card.get(name) or 0 for card in records])
+
+    valid = np.ones(len(records), dtype=bool)
+    for name in ("card_id", "name", "uri", "scryfall_uri"):
+        valid &= np.fromiter(
+            (value is not None for value in columns[name]), bool, len(records)
+        )
+    if not valid.all():
+        keep = np.flatnonzero(valid).tolist()
+        columns = {
+            name: (
+                column[keep]
+                if isinstance(column, np.ndarray)
+                else [column[i] for i in keep]
+            )
+            for name, column in columns.items()
+        }
+    return columnar_rows(columns)
+
+
+def columnar_response(properties: list[dict]) -> list[dict]:
+    # Transpose stored rows, convert UUID columns, rebuild response rows
+    keys = list(properties[0])
+    columns = dict(zip(keys, map(list, zip(*map(itemgetter(*keys), properties)))))
+    for name in UUID_PROPERTIES:
+        get = uuid_strings.get
+        columns[name] = [
+            get(value) or uuid_strings.setdefault(value, str(value))
+            for value in columns[name]
+        ]
+    for name in NUMERIC_PROPERTIES:
+        columns[name] = np.asarray(columns[name])
+    return columnar_rows(columns)
+
+
+def report(label: str, cards: int, repeat: int, before, after, columnar):
+    times = [
+        min(timeit.repeat(run, number=1, repeat=repeat))
+        for run in (before, after, columnar)
+    ]
+    per_card, records, columns = (time / cards * 1e6 for time in times)
+    print(
+        f"{label:<12} per-card {per_card:7.2f} us/card | "
+        f"card_records {records:7.2f} us/card ({times[0] / times[1]:4.2f}x) | "
+        f"columnar {columns:7.2f} us/card ({times[0] / times[2]:4.2f}x)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cards", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    records = make_scryfall_records(args.cards)
+    properties = stored_properties(records)
+
+    assert per_card_scryfall(records) == normalize_scryfall(records)
+    assert per_card_response(properties) == normalize_properties(properties)
+    assert per_card_scryfall(records) == columnar_scryfall(records)
+    assert per_card_response(properties) == columnar_response(properties)
+
+    report(
+        "ingestion",
+        args.cards,
+        args.repeat,
+        lambda: per_card_scryfall(records),
+        lambda: normalize_scryfall(records),
+        lambda: columnar_scryfall(records),
+    )
+    report(
+        "response",
+        args.cards,
+        args.repeat,
+        lambda: per_card_response(properties),
+        lambda: normalize_properties(properties),
+        lambda: columnar_response(properties),
+    )
+
+
+if __name__ == "__main__":
+    main()
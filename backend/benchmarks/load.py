@@ -0,0 +1,334 @@
+"""Load test for the API with a mixed browse/swipe/search/deck workload.
+
+Runs in-process against the local stand-in backend by default (see
+local_backend.py), or against a running server with --url. Run from the
+repository root:
+
+    python -m backend.benchmarks.load --concurrency 32 --duration 30 --output after.json
+    python -m backend.benchmarks.load --compare before.json --output after.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+SCENARIOS = ("browse", "swipe", "search", "deck")
+DEFAULT_MIX = "browse=3,swipe=4,search=2,deck=1"
+SEARCH_TERMS = ["elf", "wizard", "instant", "land", "draw", "dragon", "artifact"]
+MANA = ["W", "U", "B", "R", "G"]
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario: {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.recording = False
+
+    async def post(self, http: httpx.AsyncClient, endpoint: str, payload: dict):
+        start = time.perf_counter()
+        try:
+            response = await http.post(endpoint, json=payload)
+            failed = response.status_code >= 400
+            body = None if failed else response.json()
+        except Exception:
+            failed, body = True, None
+        elapsed = time.perf_counter() - start
+        if self.recording:
+            self.latencies.setdefault(endpoint, []).append(elapsed)
+            if failed:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return body
+
+    def summary(self, duration: float) -> dict:
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values.sort()
+            errors = self.errors.get(endpoint, 0)
+            endpoints[endpoint] = {
+                "requests": len(values),
+                "errors": errors,
+                "error_rate": errors / len(values),
+                "rps": len(values) / duration,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": values[-1] * 1000,
+            }
+        total = sum(len(values) for values in self.latencies.values())
+        errors = sum(self.errors.values())
+        return {
+            "requests": total,
+            "errors": errors,
+            "rps": total / duration,
+            "endpoints": endpoints,
+        }
+
+
+class VirtualUser:
+    """One simulated player stepping through weighted scenarios."""
+
+    def __init__(self, index: int, seed: int, recorder: Recorder, mix: dict):
+        self.user_id = f"load-test-{seed}-{index}"
+        self.rng = random.Random(seed * 100003 + index)
+        self.recorder = recorder
+        self.scenarios = list(mix)
+        self.weights = list(mix.values())
+        self.collected: list[dict] = []
+
+    def mana(self) -> list[str]:
+        if self.rng.random() < 0.7:
+            return []
+        return self.rng.sample(MANA, self.rng.randint(1, 2))
+
+    async def run(self, http: httpx.AsyncClient, deadline: float):
+        while time.perf_counter() < deadline:
+            scenario = self.rng.choices(self.scenarios, self.weights)[0]
+            await getattr(self, scenario)(http)
+
+    async def browse(self, http):
+        await self.recorder.post(
+            http,
+            "/cards",
+            {
+                "pageSize": 20,
+                "page": self.rng.randint(1, 50),
+                "userId": self.user_id,
+                "selectedMana": self.mana(),
+                "view": "thumbnail",
+            },
+        )
+
+    async def swipe(self, http):
+        body = await self.recorder.post(
+            http,
+            "/user_recommendation",
+            {
+                "numberOfCards": 5,
+                "userId": self.user_id,
+                "selectedMana": self.mana(),
+                "view": "thumbnail",
+            },
+        )
+        added = []
+        for card in (body or {}).get("cards", []):
+            interaction = "added" if self.rng.random() < 0.4 else "discarded"
+            await self.recorder.post(
+                http,
+                "/add_interaction",
+                {
+                    "userId": self.user_id,
+                    "cardId": card["card_id"],
+                    "interaction": interaction,
+                    "weight": 1.0 if interaction == "added" else -1.0,
+                },
+            )
+            if interaction == "added":
+                added.append(card)
+                self.collected.append(card)
+        if added:
+            await self.recorder.post(
+                http,
+                "/card_recommendation",
+                {
+                    "numberOfCards": 5,
+                    "cardIds": [card["card_id"] for card in added],
+                    "userId": self.user_id,
+                    "selectedMana": [],
+                    "view": "thumbnail",
+                },
+            )
+
+    async def search(self, http):
+        await self.recorder.post(
+            http,
+            "/card_search",
+            {
+                "query": self.rng.choice(SEARCH_TERMS),
+                "userId": self.user_id,
+                "numberOfCards": 10,
+                "numberOfInteractions": len(self.collected),
+                "numberOfDeck": len(self.collected),
+                "searchType": self.rng.choice(["hybrid", "recommended"]),
+                "selectedMana": self.mana(),
+                "view": "thumbnail",
+            },
+        )
+
+    async def deck(self, http):
+        await self.recorder.post(http, "/get_interactions", {"userId": self.user_id})
+        deck = [{"card_type": card, "quantity": 1} for card in self.collected[-60:]]
+        await self.recorder.post(
+            http,
+            "/save_deck",
+            {"userId": self.user_id, "deck_string": json.dumps(deck)},
+        )
+        for card in self.collected[-3:]:
+            await self.recorder.post(
+                http,
+                "/update_deck",
+                {
+                    "userId": self.user_id,
+                    "changes": [{"cardId": card["card_id"], "quantity": 1}],
+                },
+            )
+        await self.recorder.post(http, "/get_deck", {"userId": self.user_id})
+
+
+async def run_load(http: httpx.AsyncClient, args, mix: dict) -> dict:
+    recorder = Recorder()
+    users = [VirtualUser(i, args.seed, recorder, mix) for i in range(args.concurrency)]
+
+    if args.warmup:
+        deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(*(user.run(http, deadline) for user in users))
+
+    recorder.recording = True
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(user.run(http, deadline) for user in users))
+    return recorder.summary(time.perf_counter() - start)
+
+
+async def run_in_process(args, mix: dict) -> dict:
+    os.environ.setdefault("RECOMMENDER_BACKEND", "local")
+    os.environ.setdefault("COLLECTION_NAME", "Cards")
+    os.environ.setdefault("LOG_LEVEL", "warn")
+    from ..api import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://load-test", timeout=args.timeout
+        ) as http:
+            return await run_load(http, args, mix)
+
+
+async def run_remote(args, mix: dict) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=args.url, timeout=args.timeout, limits=limits
+    ) as http:
+        return await run_load(http, args, mix)
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(report: dict):
+    print(
+        f"{'endpoint':<24}{'requests':>9}{'errors':>8}{'rps':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    )
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"{endpoint:<24}{stats['requests']:>9}{stats['errors']:>8}"
+            f"{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}"
+            f"{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}"
+        )
+    print(
+        f"{'total':<24}{report['requests']:>9}{report['errors']:>8}"
+        f"{report['rps']:>9.1f}"
+    )
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """Endpoints whose p95 or error rate regressed against the baseline."""
+    regressions = []
+    for endpoint, stats in report["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if not before:
+            continue
+        change = stats["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0.0
+        print(
+            f"{endpoint:<24} p95 {before['p95_ms']:8.1f} -> {stats['p95_ms']:8.1f} ms"
+            f" ({change:+.0%})"
+        )
+        if change > threshold:
+            regressions.append(f"{endpoint}: p95 {change:+.0%}")
+        if stats["error_rate"] > before["error_rate"] + 0.01:
+            regressions.append(
+                f"{endpoint}: error rate {before['error_rate']:.1%}"
+                f" -> {stats['error_rate']:.1%}"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running API, else in-process")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--mix", default=DEFAULT_MIX)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="Allowed p95 increase"
+    )
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    runner = run_remote if args.url else run_in_process
+    results = asyncio.run(runner(args, mix))
+    report = {
+        "commit": git_commit(),
+        "config": {
+            "target": args.url or "in-process",
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": mix,
+            "seed": args.seed,
+        },
+        **results,
+    }
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        if regressions:
+            print("Regressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import asyncio
+import time
+from array import array
+
+from wasabi import msg  # type: ignore[import]
+
+from .background import cancel_tasks
+
+WUBRG = "WUBRG"
+
+CATALOG_PROPERTIES = ["card_id", "name", "image_uri", "color_identity"]
+
+
+def mask_colors(mask: int) -> list[str]:
+    return [color for i, color in enumerate(WUBRG) if mask & (1 << i)]
+
+
+def color_mask(colors) -> int:
+    mask = 0
+    for color in colors:
+        index = WUBRG.find(color)
+        if index >= 0:
+            mask |= 1 << index
+    return mask
+
+
+class CardCatalog:
+    """Compact in-memory copy of the static card data.
+
+    Cards are stored as parallel columns ordered by name, so a card's ordinal
+    is also its position in the name-sorted listing used by /cards.
+    """
+
+    def __init__(
+        self,
+        client,
+        collection_name: str,
+        page_size: int = 1000,
+        refresh_interval: float = 300,
+    ):
+        self.client = client
+        self.collection_name = collection_name
+        self.page_size = page_size
+        self.refresh_interval = refresh_interval
+
+        self.card_ids: list[str] = []
+        self.names: list[str] = []
+        self.image_uris: list[str] = []
+        self.color_masks = array("B")
+        self.ordinals: dict[str, int] = {}
+
+        # One bucket of ordinals per WUBRG subset (32 in total)
+        self.color_buckets: list[array] = [array("I") for _ in range(32)]
+        self._matches: dict[int, array] = {}
+
+        self.version = 0
+        self.total_count = 0
+        self.fingerprint = 0
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self.card_ids)
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at > 0
+
+    async def load(self):
+        async with self._lock:
+            await self._load()
+
+    async def _load(self):
+        start_time = time.time()
+        self._swap(await self._fetch_rows())
+        msg.good(
+            f"Card catalog loaded: {len(self.card_ids)} cards in {self.loaded_at - start_time:.2f} seconds"
+        )
+
+    async def _fetch_rows(self) -> list[tuple]:
+        collection = self.client.collections.get(self.collection_name)
+
+        rows = []
+        after = None
+        while True:
+            response = await collection.query.fetch_objects(
+                limit=self.page_size,
+                after=after,
+                return_properties=CATALOG_PROPERTIES,
+            )
+            if not response.objects:
+                break
+            for card in response.objects:
+                rows.append(
+                    (
+                        card.properties.get("name") or "",
+                        str(card.properties["card_id"]),
+                        card.properties.get("image_uri") or "",
+                        color_mask(card.properties.get("color_identity") or []),
+                    )
+                )
+            after = response.objects[-1].uuid
+            if len(response.objects) < self.page_size:
+                break
+
+        rows.sort()
+        return rows
+
+    def _swap(self, rows: list[tuple]):
+        # Swap every column in at once so readers never see a half-built catalog
+        self.names = [row[0] for row in rows]
+        self.card_ids = [row[1] for row in rows]
+        self.image_uris = [row[2] for row in rows]
+        self.color_masks = array("B", (row[3] for row in rows))
+        self.ordinals = {card_id: i for i, card_id in enumerate(self.card_ids)}
+
+        color_buckets = [array("I") for _ in range(32)]
+        for ordinal, mask in enumerate(self.color_masks):
+            color_buckets[mask].append(ordinal)
+        self.color_buckets = color_buckets
+        self._matches = {}
+
+        self.total_count = len(rows)
+        self.fingerprint = hash(tuple(rows))
+        self.version += 1
+        self.loaded_at = self.checked_at = time.time()
+
+    async def ensure_loaded(self):
+        if not self.loaded:
+            async with self._lock:
+                # Concurrent first requests share the load of whoever got the lock
+                if not self.loaded:
+                    await self._load()
+        elif time.time() - self.checked_at > self.refresh_interval:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self.refresh())
+
+    async def stop(self):
+        await cancel_tasks([self._refresh_task])
+
+    async def refresh(self):
+        """Reload the catalog if any card was added, removed or changed since the last load.
+
+        The card count alone misses cards re-ingested with new data, so the
+        rows are compared as a whole. Only a real change bumps the version,
+        which is what drops caches keyed on ordinals.
+        """
+        self.checked_at = time.time()
+        try:
+            async with self._lock:
+                rows = await self._fetch_rows()
+                if hash(tuple(rows)) != self.fingerprint:
+                    msg.info(
+                        f"Card catalog changed ({self.total_count} -> {len(rows)} cards), updating"
+                    )
+                    self._swap(rows)
+        except Exception as e:
+            msg.fail(f"An error occurred while refreshing the card catalog: {str(e)}")
+
+    def get(self, card_id: str) -> dict | None:
+        ordinal = self.ordinals.get(card_id)
+        if ordinal is None:
+            return None
+        return {
+            "name": self.names[ordinal],
+            "image_uri": self.image_uris[ordinal],
+        }
+
+    def cards(self, card_ids: list[str]) -> list[dict] | None:
+        """Cards with only CATALOG_PROPERTIES, or None if any id is unknown."""
+        cards = []
+        for card_id in card_ids:
+            ordinal = self.ordinals.get(card_id)
+            if ordinal is None:
+                return None
+            cards.append(
+                {
+                    "card_id": card_id,
+                    "name": self.names[ordinal],
+                    "image_uri": self.image_uris[ordinal],
+                    "color_identity": mask_colors(self.color_masks[ordinal]),
+                }
+            )
+        return cards
+
+    def card_mask(self, card: dict) -> int:
+        """Color identity mask of a card dict, precomputed when the card is known."""
+        ordinal = self.ordinals.get(card["card_id"])
+        if ordinal is not None:
+            return self.color_masks[ordinal]
+        return color_mask(card.get("color_identity") or [])
+
+    def match_rate(self, required: int) -> float:
+        """Share of all cards whose color identity contains all of `required`."""
+        if not self.card_ids:
+            return 0.5 ** bin(required).count("1")
+        return len(self.matching(required)) / len(self.card_ids)
+
+    def matching(self, required: int) -> array:
+        """Ordinals (in name order) of cards whose color identity contains all of `required`."""
+        if required == 0:
+            return array("I", range(len(self.card_ids)))
+
+        ordinals = self._matches.get(required)
+        if ordinals is None:
+            merged = []
+            for mask in range(32):
+                if mask & required == required:
+                    merged.extend(self.color_buckets[mask])
+            ordinals = array("I", sorted(merged))
+            self._matches[required] = ordinals
+        return ordinals
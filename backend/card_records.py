@@ -0,0 +1,135 @@
+"""Card normalization shared by ingestion (add_items.py) and the API.
+
+Batches stay row-wise on purpose. Both ends of the stage consume one dict
+per card: RecommenderItem properties on the way in, orjson on the way out.
+A NumPy-backed columnar batch has to transpose into columns and back into
+dicts. That costs more per card than building the dicts directly.
+python -m backend.benchmarks.card_records times both designs.
+"""
+
+from wasabi import msg  # type: ignore[import]
+
+# Every property stored for a card, in schema order (see create_schema.py)
+CARD_PROPERTIES = [
+    "card_id",
+    "oracle_id",
+    "name",
+    "released_at",
+    "uri",
+    "scryfall_uri",
+    "image_uri",
+    "type_line",
+    "oracle_text",
+    "colors",
+    "color_identity",
+    "keywords",
+    "produced_mana",
+    "set_name",
+    "rarity",
+    "power",
+    "toughness",
+    "mana_cost",
+    "loyalty",
+    "defense",
+    "life_modifier",
+    "hand_modifier",
+    "edhrec_rank",
+    "cmc",
+]
+
+UUID_PROPERTIES = ("card_id", "oracle_id")
+
+# Named field presets for the card list endpoints
+CARD_VIEWS = {
+    "thumbnail": ["card_id", "name", "image_uri", "color_identity"],
+    "detail": CARD_PROPERTIES,
+}
+
+# Card and oracle ids repeat across requests, so their string forms are reused
+MAX_UUID_STRINGS = 200000
+_uuid_strings: dict = {}
+
+
+def normalize_scryfall(records: list[dict]) -> list[dict]:
+    """Card properties for a batch of raw Scryfall records, skipping malformed ones."""
+    cards = []
+    skipped = 0
+    for card in records:
+        try:
+            cards.append(
+                {
+                    "card_id": card["id"],
+                    "oracle_id": card.get("oracle_id", ""),
+                    "name": card["name"],
+                    "released_at": card.get("released_at", ""),
+                    "uri": card["uri"],
+                    "scryfall_uri": card["scryfall_uri"],
+                    "image_uri": (
+                        card["image_uris"]["normal"] if "image_uris" in card else ""
+                    ),
+                    "type_line": card.get("type_line", ""),
+                    "oracle_text": card.get("oracle_text", ""),
+                    "colors": card.get("colors", []),
+                    "color_identity": card.get("color_identity", []),
+                    "keywords": card.get("keywords", []),
+                    "produced_mana": card.get("produced_mana", []),
+                    "set_name": card.get("set_name", ""),
+                    "rarity": card.get("rarity", ""),
+                    "power": card.get("power", ""),
+                    "toughness": card.get("toughness", ""),
+                    "mana_cost": card.get("mana_cost", ""),
+                    "loyalty": card.get("loyalty", ""),
+                    "defense": card.get("defense", ""),
+                    "life_modifier": card.get("life_modifier", ""),
+                    "hand_modifier": card.get("hand_modifier", ""),
+                    "edhrec_rank": card.get("edhrec_rank", 0),
+                    "cmc": card.get("cmc", 0),
+                }
+            )
+        except (KeyError, TypeError):
+            skipped += 1
+    if skipped:
+        msg.warn(f"Skipped {skipped} malformed cards")
+    return cards
+
+
+def normalize_properties(properties: list[dict]) -> list[dict]:
+    """Response-ready copies of stored card properties with UUIDs as strings."""
+    if len(_uuid_strings) > MAX_UUID_STRINGS:
+        _uuid_strings.clear()
+    get = _uuid_strings.get
+
+    cards = []
+    for stored in properties:
+        card = dict(stored)
+        for name in UUID_PROPERTIES:
+            value = card.get(name)
+            if value is None or value.__class__ is str:
+                continue
+            text = get(value)
+            if text is None:
+                text = _uuid_strings[value] = str(value)
+            card[name] = text
+        cards.append(card)
+    return cards
+
+
+def resolve_fields(fields: list[str] | None, view: str | None) -> list[str] | None:
+    """The properties to return for a request, or None for all of them."""
+    if fields:
+        requested = ["card_id"] + [field for field in fields if field != "card_id"]
+        return [field for field in requested if field in CARD_PROPERTIES]
+    if view and view != "detail":
+        return CARD_VIEWS[view]
+    return None
+
+
+def cards_from_objects(objects) -> list[dict]:
+    """Response-ready card dicts from Weaviate objects or recommender results."""
+    return normalize_properties([item.properties for item in objects])
+
+
+def to_items(cards: list[dict]) -> list:
+    from weaviate_recommend.models.data import RecommenderItem
+
+    return [RecommenderItem(id=card["card_id"], properties=card) for card in cards]
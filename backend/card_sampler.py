@@ -0,0 +1,117 @@
+import asyncio
+import random
+
+from wasabi import msg  # type: ignore[import]
+
+from .background import cancel_tasks
+from .card_catalog import CardCatalog, color_mask
+
+
+class RandomCardSampler:
+    """Draws random cards for the fallback paths without aggregate/offset queries.
+
+    A pool of already fetched cards is kept warm in the background, so a
+    fallback usually costs no Weaviate call at all. Whatever the pool cannot
+    cover is drawn from the catalog and fetched in one batched call.
+    """
+
+    def __init__(
+        self,
+        catalog: CardCatalog,
+        fetch_cards,
+        pool_size: int = 60,
+        low_watermark: int = 20,
+    ):
+        self.catalog = catalog
+        self.fetch_cards = fetch_cards
+        self.pool_size = pool_size
+        self.low_watermark = low_watermark
+
+        self.pool: list[dict] = []
+        self._pool_ids: set[str] = set()
+        self._refill_task: asyncio.Task | None = None
+
+    async def sample(
+        self,
+        k: int,
+        color_identity: list[str] | None = None,
+        exclude: set[str] | None = None,
+    ):
+        """Up to `k` random cards with the given colors and ids not in `exclude`."""
+        await self.catalog.ensure_loaded()
+        if len(self.catalog) == 0:
+            msg.warn("No cards found")
+            return []
+
+        required = color_mask(color_identity or [])
+        exclude = exclude or set()
+        cards = self._take_from_pool(k, required, exclude)
+
+        if len(cards) < k:
+            exclude = exclude | {card["card_id"] for card in cards}
+            card_ids = self._draw_ids(k - len(cards), required, exclude)
+            cards.extend(await self.fetch_cards(card_ids))
+
+        self.schedule_refill()
+        return cards
+
+    def _take_from_pool(self, k: int, required: int, exclude: set[str]) -> list[dict]:
+        taken = []
+        kept = []
+        for card in self.pool:
+            mask = color_mask(card.get("color_identity") or [])
+            if (
+                len(taken) < k
+                and mask & required == required
+                and card["card_id"] not in exclude
+            ):
+                taken.append(card)
+                self._pool_ids.discard(card["card_id"])
+            else:
+                kept.append(card)
+        self.pool = kept
+        return taken
+
+    def _candidates(self, required: int):
+        if required == 0:
+            return range(len(self.catalog))
+        return self.catalog.matching(required)
+
+    def _draw_ids(self, n: int, required: int, exclude: set[str]) -> list[str]:
+        candidates = self._candidates(required)
+        draw = random.sample(candidates, min(n + len(exclude), len(candidates)))
+
+        card_ids = []
+        for ordinal in draw:
+            card_id = self.catalog.card_ids[ordinal]
+            if card_id not in exclude:
+                card_ids.append(card_id)
+                if len(card_ids) == n:
+                    break
+        return card_ids
+
+    def schedule_refill(self):
+        if len(self.pool) > self.low_watermark:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self.refill())
+
+    async def stop(self):
+        await cancel_tasks([self._refill_task])
+
+    async def refill(self):
+        try:
+            await self.catalog.ensure_loaded()
+            missing = self.pool_size - len(self.pool)
+            if missing <= 0 or len(self.catalog) == 0:
+                return
+
+            card_ids = self._draw_ids(missing, 0, self._pool_ids)
+            for card in await self.fetch_cards(card_ids):
+                if card["card_id"] not in self._pool_ids:
+                    self._pool_ids.add(card["card_id"])
+                    self.pool.append(card)
+        except Exception as e:
+            msg.fail(
+                f"An error occurred while refilling the random card pool: {str(e)}"
+            )
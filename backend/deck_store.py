@@ -0,0 +1,259 @@
+import asyncio
+import base64
+import json
+import time
+import uuid
+from collections import OrderedDict
+
+from wasabi import msg  # type: ignore[import]
+
+from .background import cancel_tasks
+
+# Stored decks start with this so they can be told apart from the old JSON ones
+DECK_PREFIX = "d1:"
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, position: int) -> tuple[int, int]:
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, position
+        shift += 7
+
+
+def _uuid_bytes(card_id: str) -> bytes | None:
+    # Only the canonical form, so decoding gives back the exact same id
+    try:
+        value = uuid.UUID(card_id)
+    except ValueError:
+        return None
+    return value.bytes if str(value) == card_id else None
+
+
+def encode_deck(deck: dict[str, int]) -> str:
+    """A deck as "d1:" and base64 of (count, card id) pairs.
+
+    Counts are varints. Card ids that are UUIDs, which is all of them for
+    Scryfall data, take a zero byte and their 16 raw bytes; any other id
+    takes its UTF-8 length plus one and its bytes. About 24 characters a
+    card, against well over a kilobyte for the full card JSON.
+    """
+    out = bytearray()
+    for card_id, count in deck.items():
+        _write_varint(out, count)
+        packed = _uuid_bytes(card_id)
+        if packed is not None:
+            out.append(0)
+            out += packed
+        else:
+            raw = card_id.encode("utf-8")
+            _write_varint(out, len(raw) + 1)
+            out += raw
+    return DECK_PREFIX + base64.b64encode(bytes(out)).decode("ascii")
+
+
+def decode_deck(text: str | None) -> dict[str, int]:
+    """The card counts of a stored deck, in either the compact or the old JSON form."""
+    if not text:
+        return {}
+    if not text.startswith(DECK_PREFIX):
+        # Decks saved before the compact form: [{card_type, quantity}]
+        return {
+            str(card["card_type"]["card_id"]): int(card["quantity"])
+            for card in json.loads(text)
+            if int(card["quantity"]) > 0
+        }
+
+    data = base64.b64decode(text[len(DECK_PREFIX) :])
+    deck = {}
+    position = 0
+    while position < len(data):
+        count, position = _read_varint(data, position)
+        length, position = _read_varint(data, position)
+        if length == 0:
+            card_id = str(uuid.UUID(bytes=data[position : position + 16]))
+            position += 16
+        else:
+            card_id = data[position : position + length - 1].decode("utf-8")
+            position += length - 1
+        deck[card_id] = count
+    return deck
+
+
+class DeckEntry:
+    __slots__ = ("cards", "version", "saved_version", "changed_at", "dirty_since")
+
+    def __init__(self, cards: dict[str, int]):
+        self.cards = cards
+        self.version = 0
+        self.saved_version = 0
+        self.changed_at = 0.0
+        self.dirty_since = 0.0
+
+
+class DeckStore:
+    """Read-through cache of user decks with debounced write-behind.
+
+    A deck is loaded once with `load(user_id)` (the stored string) and then
+    served from memory. Edits apply to the cached copy at once; the stored
+    copy is written with `save(user_id, deck_string)` once no edit has come
+    in for `debounce` seconds, or at the latest `max_delay` seconds after
+    the first unsaved one, so a burst of edits costs one upstream update.
+    Decks with unsaved edits are never evicted; `stop()` writes them out.
+    """
+
+    def __init__(
+        self,
+        load,
+        save,
+        debounce: float = 2.0,
+        max_delay: float = 10.0,
+        retry_interval: float = 30.0,
+        max_users: int = 10000,
+    ):
+        self.load = load
+        self.save = save
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.retry_interval = retry_interval
+        self.max_users = max_users
+
+        self._decks: OrderedDict[str, DeckEntry] = OrderedDict()
+        self._loading: dict[str, asyncio.Task] = {}
+        self._writers: dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.loads = 0
+        self.edits = 0
+        self.writes = 0
+        self.failed = 0
+        self.evictions = 0
+
+    async def get(self, user_id: str) -> dict[str, int]:
+        return dict((await self._entry(user_id)).cards)
+
+    async def apply(self, user_id: str, changes: list[tuple[str, int]]):
+        """Add (positive) or remove (negative) copies of cards, returning the deck."""
+        entry = await self._entry(user_id)
+        for card_id, delta in changes:
+            count = entry.cards.get(card_id, 0) + delta
+            if count > 0:
+                entry.cards[card_id] = count
+            else:
+                entry.cards.pop(card_id, None)
+        self._changed(user_id, entry)
+        return dict(entry.cards)
+
+    def replace(self, user_id: str, cards: dict[str, int]):
+        entry = self._decks.get(user_id)
+        if entry is None:
+            # Nothing to read first, the whole deck is known
+            entry = self._store(user_id, {})
+        entry.cards = {card_id: count for card_id, count in cards.items() if count > 0}
+        self._changed(user_id, entry)
+
+    async def stop(self):
+        await cancel_tasks(list(self._loading.values()))
+        await cancel_tasks(list(self._writers.values()))
+        for user_id, entry in list(self._decks.items()):
+            if entry.version != entry.saved_version:
+                await self._write(user_id, entry)
+
+    async def _entry(self, user_id: str) -> DeckEntry:
+        entry = self._decks.get(user_id)
+        if entry is not None:
+            self.hits += 1
+            self._decks.move_to_end(user_id)
+            return entry
+
+        task = self._loading.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._load(user_id))
+            self._loading[user_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id: str) -> DeckEntry:
+        cards = decode_deck(await self.load(user_id))
+        self.loads += 1
+        # A replace() while loading already holds the newer deck
+        return self._decks.get(user_id) or self._store(user_id, cards)
+
+    def _store(self, user_id: str, cards: dict[str, int]) -> DeckEntry:
+        entry = self._decks[user_id] = DeckEntry(cards)
+        self._evict()
+        return entry
+
+    def _changed(self, user_id: str, entry: DeckEntry):
+        now = time.monotonic()
+        if entry.version == entry.saved_version:
+            entry.dirty_since = now
+        entry.version += 1
+        entry.changed_at = now
+        self.edits += 1
+        if user_id not in self._writers:
+            task = asyncio.create_task(self._write_later(user_id, entry))
+            self._writers[user_id] = task
+            task.add_done_callback(lambda _: self._writers.pop(user_id, None))
+
+    async def _write_later(self, user_id: str, entry: DeckEntry):
+        while entry.version != entry.saved_version:
+            due = min(
+                entry.changed_at + self.debounce, entry.dirty_since + self.max_delay
+            )
+            wait = due - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            elif not await self._write(user_id, entry):
+                await asyncio.sleep(self.retry_interval)
+
+    async def _write(self, user_id: str, entry: DeckEntry) -> bool:
+        version = entry.version
+        try:
+            await self.save(user_id, encode_deck(entry.cards))
+        except Exception as e:
+            self.failed += 1
+            msg.fail(f"An error occurred while saving deck for {user_id}: {str(e)}")
+            return False
+        self.writes += 1
+        entry.saved_version = version
+        if entry.version != version:
+            # Edited while saving, wait out a fresh debounce for the rest
+            entry.dirty_since = time.monotonic()
+        return True
+
+    def _evict(self):
+        excess = len(self._decks) - self.max_users
+        for user_id in list(self._decks):
+            if excess <= 0:
+                break
+            entry = self._decks[user_id]
+            if entry.version == entry.saved_version:
+                del self._decks[user_id]
+                self.evictions += 1
+                excess -= 1
+
+    def stats(self) -> dict:
+        return {
+            "decks": len(self._decks),
+            "unsaved": sum(
+                entry.version != entry.saved_version for entry in self._decks.values()
+            ),
+            "hits": self.hits,
+            "loads": self.loads,
+            "edits": self.edits,
+            "writes": self.writes,
+            "failed": self.failed,
+            "evictions": self.evictions,
+        }
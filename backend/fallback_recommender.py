@@ -0,0 +1,304 @@
+import asyncio
+import math
+import re
+import time
+import zlib
+from collections import OrderedDict, deque
+
+from wasabi import msg  # type: ignore[import]
+
+from .background import cancel_tasks
+from .card_catalog import color_mask
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+FALLBACK_PROPERTIES = [
+    "card_id",
+    "type_line",
+    "oracle_text",
+    "keywords",
+    "color_identity",
+]
+
+TOKEN = re.compile(r"[a-z0-9+\-/{}']+")
+
+
+def card_tokens(card: dict) -> list[str]:
+    """Feature tokens for a card; type, keyword and color tokens get a prefix."""
+    tokens = TOKEN.findall((card.get("oracle_text") or "").lower())
+    tokens += [
+        "t:" + word for word in TOKEN.findall((card.get("type_line") or "").lower())
+    ]
+    tokens += ["k:" + keyword.lower() for keyword in card.get("keywords") or []]
+    tokens += ["c:" + color for color in card.get("color_identity") or []]
+    return tokens
+
+
+def query_tokens(text: str) -> list[str]:
+    # Search text can match oracle text, card types and keywords alike
+    words = TOKEN.findall(text.lower())
+    return words + ["t:" + word for word in words] + ["k:" + word for word in words]
+
+
+def feature(token: str, n_features: int) -> int:
+    # crc32 is stable across processes, unlike hash()
+    return zlib.crc32(token.encode("utf-8")) % n_features
+
+
+class FallbackRecommender:
+    """In-process recommendations for when the recommender service fails.
+
+    Every card gets a hashed TF-IDF vector over its oracle text, type line,
+    keywords and color identity, L2-normalized and stored as a float32 CSR
+    matrix. Item, recent-interaction and text queries are answered with a
+    vectorized cosine top-k over all cards, restricted to the mana filter.
+    Needs NumPy; without it `ready` stays False and callers keep their own
+    fallback.
+    """
+
+    def __init__(
+        self,
+        client,
+        collection_name: str,
+        n_features: int = 1 << 18,
+        page_size: int = 1000,
+        max_users: int = 10000,
+        recent_interactions: int = 50,
+    ):
+        self.client = client
+        self.collection_name = collection_name
+        self.n_features = n_features
+        self.page_size = page_size
+        self.max_users = max_users
+        self.recent_interactions = recent_interactions
+
+        self.card_ids: list[str] = []
+        self.ordinals: dict[str, int] = {}
+        self.ready = False
+
+        # Recent interactions per user, since the upstream history is unavailable too
+        self._recent: OrderedDict[str, deque] = OrderedDict()
+        self._load_task: asyncio.Task | None = None
+
+        self.queries = 0
+
+    def schedule_load(self):
+        if np is None:
+            msg.warn("NumPy is not installed, the local fallback recommender is off")
+            return
+        if self._load_task is None or self._load_task.done():
+            self._load_task = asyncio.create_task(self.load())
+
+    async def stop(self):
+        await cancel_tasks([self._load_task])
+
+    async def load(self):
+        try:
+            start_time = time.time()
+            collection = self.client.collections.get(self.collection_name)
+
+            cards = []
+            after = None
+            while True:
+                response = await collection.query.fetch_objects(
+                    limit=self.page_size,
+                    after=after,
+                    return_properties=FALLBACK_PROPERTIES,
+                )
+                if not response.objects:
+                    break
+                cards.extend(card.properties for card in response.objects)
+                after = response.objects[-1].uuid
+                if len(response.objects) < self.page_size:
+                    break
+
+            # Hashing a few hundred thousand tokens would stall the event loop
+            await asyncio.to_thread(self.build, cards)
+            msg.good(
+                f"Fallback recommender built: {len(self.card_ids)} cards in {time.time() - start_time:.2f} seconds"
+            )
+        except Exception as e:
+            msg.fail(f"An error occurred while building the fallback index: {str(e)}")
+
+    def build(self, cards: list[dict]):
+        n_features = self.n_features
+        card_ids = []
+        masks = []
+        indptr = [0]
+        indices = []
+        counts = []
+        document_frequency: dict[int, int] = {}
+
+        for card in cards:
+            term_counts: dict[int, int] = {}
+            for token in card_tokens(card):
+                index = feature(token, n_features)
+                term_counts[index] = term_counts.get(index, 0) + 1
+            for index in term_counts:
+                document_frequency[index] = document_frequency.get(index, 0) + 1
+            indices.extend(term_counts)
+            counts.extend(term_counts.values())
+            indptr.append(len(indices))
+            card_ids.append(str(card["card_id"]))
+            masks.append(color_mask(card.get("color_identity") or []))
+
+        total = len(card_ids)
+        idf = np.ones(n_features, dtype=np.float32)
+        for index, frequency in document_frequency.items():
+            idf[index] = math.log((1 + total) / (1 + frequency)) + 1
+
+        indptr = np.asarray(indptr, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int32)
+        rows = np.repeat(np.arange(total, dtype=np.int32), np.diff(indptr))
+        data = (1 + np.log(np.asarray(counts, dtype=np.float32))) * idf[indices]
+        norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=total))
+        data = (data / np.maximum(norms, 1e-12)[rows]).astype(np.float32)
+
+        # A column-major copy, so scoring only touches the query's features
+        order = np.argsort(indices, kind="stable")
+        column_indptr = np.zeros(n_features + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=n_features), out=column_indptr[1:])
+
+        # Swap the whole index in at once so queries never see a half-built one
+        self.idf = idf
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.column_indptr = column_indptr
+        self.column_rows = rows[order]
+        self.column_data = data[order]
+        self.masks = np.asarray(masks, dtype=np.uint8)
+        self.card_ids = card_ids
+        self.ordinals = {card_id: i for i, card_id in enumerate(card_ids)}
+        self.ready = total > 0
+
+    def record(self, user_id: str, card_id: str, weight: float):
+        recent = self._recent.get(user_id)
+        if recent is None:
+            recent = self._recent[user_id] = deque(maxlen=self.recent_interactions)
+        self._recent.move_to_end(user_id)
+        recent.append((card_id, weight))
+        while len(self._recent) > self.max_users:
+            self._recent.popitem(last=False)
+
+    def knows(self, user_id: str) -> bool:
+        return user_id in self._recent
+
+    def seed(self, user_id: str, interactions: list[tuple[str, float]]):
+        """Start a user's recent interactions from an earlier history, e.g. after a restart."""
+        if user_id in self._recent:
+            return
+        for card_id, weight in interactions[-self.recent_interactions :]:
+            self.record(user_id, card_id, weight)
+
+    def discard(self, user_id: str):
+        self._recent.pop(user_id, None)
+
+    def similar(
+        self,
+        card_ids: list[str],
+        limit: int,
+        selected_mana: list[str] | None = None,
+        exclude_ids=(),
+    ) -> list[str] | None:
+        """Cards closest to the given ones, or None if there is nothing to go on."""
+        return self._search(
+            [(card_id, 1.0) for card_id in card_ids],
+            limit,
+            selected_mana,
+            exclude_ids,
+        )
+
+    def for_user(
+        self,
+        user_id: str,
+        limit: int,
+        selected_mana: list[str] | None = None,
+        exclude_ids=(),
+    ) -> list[str] | None:
+        """Cards closest to the user's recent interactions, discards pulling away."""
+        recent = list(self._recent.get(user_id, ()))
+        if not any(weight > 0 for _, weight in recent):
+            return None
+        return self._search(recent, limit, selected_mana, exclude_ids)
+
+    def search(
+        self,
+        text: str,
+        limit: int,
+        selected_mana: list[str] | None = None,
+        exclude_ids=(),
+    ) -> list[str] | None:
+        if not self.ready:
+            return None
+        query = np.zeros(self.n_features, dtype=np.float32)
+        for token in query_tokens(text):
+            index = feature(token, self.n_features)
+            query[index] += self.idf[index]
+        if not query.any():
+            return None
+        return self._top_k(query, limit, selected_mana, self._ordinals(exclude_ids))
+
+    def _search(
+        self, weighted_ids, limit, selected_mana, exclude_ids
+    ) -> list[str] | None:
+        if not self.ready:
+            return None
+
+        query = np.zeros(self.n_features, dtype=np.float32)
+        exclude = set()
+        for card_id, weight in weighted_ids:
+            ordinal = self.ordinals.get(card_id)
+            if ordinal is None:
+                continue
+            start, end = self.indptr[ordinal], self.indptr[ordinal + 1]
+            np.add.at(query, self.indices[start:end], weight * self.data[start:end])
+            exclude.add(ordinal)
+        if not exclude or not query.any():
+            return None
+        return self._top_k(
+            query, limit, selected_mana, exclude | self._ordinals(exclude_ids)
+        )
+
+    def _ordinals(self, card_ids) -> set[int]:
+        ordinals = (self.ordinals.get(card_id) for card_id in card_ids)
+        return {ordinal for ordinal in ordinals if ordinal is not None}
+
+    def _top_k(self, query, limit: int, selected_mana, exclude) -> list[str]:
+        self.queries += 1
+        features = np.flatnonzero(query)
+        starts = self.column_indptr[features]
+        lengths = self.column_indptr[features + 1] - starts
+        # Positions of every posting of every query feature, without a Python loop
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        positions = offsets + np.arange(lengths.sum())
+
+        # Rows are unit length, so the dot product ranks like cosine similarity
+        scores = np.bincount(
+            self.column_rows[positions],
+            weights=self.column_data[positions] * np.repeat(query[features], lengths),
+            minlength=len(self.card_ids),
+        )
+        required = color_mask(selected_mana or [])
+        if required:
+            scores[(self.masks & required) != required] = -np.inf
+        if exclude:
+            scores[list(exclude)] = -np.inf
+
+        limit = min(limit, len(scores))
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.card_ids[i] for i in top if np.isfinite(scores[i])]
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "cards": len(self.card_ids),
+            "users": len(self._recent),
+            "queries": self.queries,
+        }
@@ -0,0 +1,58 @@
+import sqlite3
+
+
+class IngestManifest:
+    """Local SQLite record of what add_items.py has already uploaded.
+
+    `cards` holds the content hash of every card confirmed by the recommender,
+    so unchanged cards are skipped on the next run. `state` holds the last
+    confirmed position in the dataset file so an interrupted run can resume.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS cards (
+                card_id TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """)
+        self.connection.commit()
+
+    def hashes(self) -> dict[str, str]:
+        return dict(self.connection.execute("SELECT card_id, content_hash FROM cards"))
+
+    def get_state(self, key: str, default=None):
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else default
+
+    def set_state(self, key: str, value):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+            (key, str(value)),
+        )
+
+    def checkpoint(self, confirmed: list[tuple[str, str]], **state):
+        """Record confirmed cards and the new resume position in one transaction."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cards (card_id, content_hash) VALUES (?, ?)",
+                confirmed,
+            )
+            for key, value in state.items():
+                self.set_state(key, value)
+
+    def reset(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM cards")
+            self.connection.execute("DELETE FROM state")
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,429 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from wasabi import msg  # type: ignore[import]
+
+from .background import cancel_tasks
+
+
+class InteractionBufferFullError(Exception):
+    pass
+
+
+class InteractionBatch:
+    """One upstream write of a user's interactions, sent one entry at a time.
+
+    `send(add)` runs on a recommender worker and claims each entry before
+    adding it, so once `stop()` is called no further entry goes out. That
+    makes it possible to tell, after a failure or a timeout, which entries
+    were certainly not added and can be queued again without duplicates.
+    """
+
+    def __init__(self, entries: list[dict]):
+        self.entries = entries
+        self.claimed = 0
+        self.added = 0
+        self.done = False
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._loop = asyncio.get_running_loop()
+        self._finished = asyncio.Event()
+
+    def send(self, add):
+        try:
+            for entry in self.entries:
+                with self._lock:
+                    if self._stopped:
+                        return
+                    self.claimed += 1
+                add(entry)
+                self.added += 1
+        finally:
+            with self._lock:
+                self.done = True
+            try:
+                self._loop.call_soon_threadsafe(self._finished.set)
+            except RuntimeError:
+                pass
+
+    def stop(self) -> list[dict]:
+        """Send nothing more, returning the entries that were certainly not added."""
+        with self._lock:
+            self._stopped = True
+            if self.done:
+                # The worker gave up on the entry after the last one added
+                return self.entries[self.added :]
+            # The claimed entry still on the worker may yet be added
+            return self.entries[self.claimed :]
+
+    @property
+    def in_flight(self) -> bool:
+        return self.claimed > self.added and not self.done
+
+    async def wait(self, timeout: float):
+        if self.in_flight:
+            try:
+                await asyncio.wait_for(self._finished.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+class InteractionBuffer:
+    """Write-behind queue for user interactions.
+
+    /add_interaction only appends here. A background task hands each user's
+    pending interactions to `flush_fn(user_id, batch)` once `max_batch`
+    interactions are waiting or every `flush_interval` seconds, in
+    InteractionBatch chunks of `chunk_size` so one heavy user never holds a
+    recommender worker for long, and with at most `max_concurrent` writes at
+    a time so recommendations keep the rest of the pool. `on_flushed(user_id,
+    count)` is called once per user after a flush that added anything.
+
+    `hold(user_id)` keeps a user's interactions from being written while
+    their upstream history is read, so that history plus `pending_for()`
+    has every interaction exactly once.
+
+    Entries that were not added are retried with exponential backoff and
+    dropped after `max_attempts`. Once `max_pending` interactions are
+    waiting, `add()` raises InteractionBufferFullError rather than waiting
+    for a flush. With a `spill_path`, interactions not yet written upstream,
+    pending or in flight, are also kept in a JSONL file and replayed on
+    start, so a crash does not lose acknowledged swipes. The file is only
+    touched by a background writer, off the event loop.
+    """
+
+    def __init__(
+        self,
+        flush_fn,
+        on_flushed=None,
+        max_batch: int = 50,
+        chunk_size: int = 10,
+        max_concurrent: int = 2,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        max_attempts: int = 5,
+        max_backoff: float = 60.0,
+        fence_timeout: float = 10.0,
+        spill_path: str | None = None,
+    ):
+        self.flush_fn = flush_fn
+        self.on_flushed = on_flushed
+        self.max_batch = max_batch
+        self.chunk_size = chunk_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.fence_timeout = fence_timeout
+        self.spill_path = spill_path
+
+        self._pending: dict[str, list[dict]] = {}
+        self._count = 0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._writers = asyncio.Semaphore(max_concurrent)
+        self._task: asyncio.Task | None = None
+        self._spill_file = None
+        self._spill_lines: list[str] = []
+        self._spill_rewrite = False
+        self._spill_wakeup = asyncio.Event()
+        self._spill_task: asyncio.Task | None = None
+        self._spill_closing = False
+
+        # Per user: the batch being written, failed attempts so far, when to
+        # retry, and a generation bumped by discard() to fence older writes
+        self._flushing: dict[str, asyncio.Event] = {}
+        self._in_flight: dict[str, list[dict]] = {}
+        self._holds: dict[str, int] = {}
+        self._writing: dict[str, InteractionBatch] = {}
+        self._attempts: dict[str, int] = {}
+        self._retry_at: dict[str, float] = {}
+        self._generations: dict[str, int] = {}
+
+        self.enqueued = 0
+        self.flushed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.batches = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    async def start(self):
+        if self.spill_path:
+            await asyncio.to_thread(self._replay_spill)
+            self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+            self._spill_task = asyncio.create_task(self._write_spill())
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        await cancel_tasks([self._task])
+        self._task = None
+        # One last attempt for everything, backoff or not
+        await self.flush(force=True)
+        if self._spill_file is not None:
+            # Not cancelled, so a write running on its thread is never cut short
+            self._spill_closing = True
+            self._spill_wakeup.set()
+            await self._spill_task
+            self._spill_task = None
+            self._spill_file.close()
+            self._spill_file = None
+
+    def add(self, user_id: str, item_id: str, interaction: str, weight: float):
+        if self._count >= self.max_pending:
+            self._wakeup.set()
+            self.rejected += 1
+            raise InteractionBufferFullError(
+                f"{self._count} interactions are already waiting to be written"
+            )
+
+        entry = {
+            "item_id": item_id,
+            "interaction_property_name": interaction,
+            "weight": weight,
+        }
+        if self._spill_file is not None:
+            self._spill_lines.append(json.dumps({"user_id": user_id, **entry}) + "\n")
+            self._spill_wakeup.set()
+
+        self._pending.setdefault(user_id, []).append(entry)
+        self._count += 1
+        self.enqueued += 1
+        if self._count >= self.max_batch:
+            self._wakeup.set()
+
+    def pending_for(self, user_id: str) -> list[dict]:
+        return list(self._pending.get(user_id, []))
+
+    async def discard(self, user_id: str):
+        """Drop a user's pending interactions and wait out any write in progress."""
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        self._attempts.pop(user_id, None)
+        self._retry_at.pop(user_id, None)
+        entries = self._pending.pop(user_id, None)
+        if entries:
+            self._count -= len(entries)
+        if entries or self._in_flight.pop(user_id, None):
+            self._rewrite_spill()
+
+        batch = self._writing.get(user_id)
+        if batch is not None:
+            batch.stop()
+            await batch.wait(self.fence_timeout)
+
+    @asynccontextmanager
+    async def hold(self, user_id: str):
+        """Write none of the user's interactions until the block is done.
+
+        A write already in progress is waited out first, so inside the block
+        every interaction is either upstream or in `pending_for()`.
+        """
+        self._holds[user_id] = self._holds.get(user_id, 0) + 1
+        try:
+            flushing = self._flushing.get(user_id)
+            if flushing is not None:
+                await flushing.wait()
+            batch = self._writing.get(user_id)
+            if batch is not None:
+                await batch.wait(self.fence_timeout)
+            yield
+        finally:
+            self._holds[user_id] -= 1
+            if not self._holds[user_id]:
+                del self._holds[user_id]
+
+    async def flush(self, force: bool = False):
+        async with self._flush_lock:
+            now = time.monotonic()
+            users = [
+                user_id
+                for user_id in self._pending
+                if force
+                or (
+                    self._retry_at.get(user_id, 0) <= now and user_id not in self._holds
+                )
+            ]
+            if not users:
+                return
+
+            flushing = {}
+            for user_id in users:
+                entries = self._pending.pop(user_id)
+                self._count -= len(entries)
+                flushing[user_id] = entries
+                # Still spilled until the write is done, in case of a crash
+                self._in_flight[user_id] = entries
+                # Set up front so hold() cannot slip in before the write starts
+                self._flushing[user_id] = asyncio.Event()
+
+            await asyncio.gather(
+                *[
+                    self._flush_user(user_id, entries)
+                    for user_id, entries in flushing.items()
+                ]
+            )
+            self._rewrite_spill()
+
+    async def _flush_user(self, user_id: str, entries: list[dict]):
+        try:
+            generation = self._generations.get(user_id, 0)
+            entries = self._coalesce(entries)
+            added = 0
+
+            for start in range(0, len(entries), self.chunk_size):
+                if self._generations.get(user_id, 0) != generation:
+                    # Discarded while earlier chunks were written
+                    break
+                batch = InteractionBatch(entries[start : start + self.chunk_size])
+                self._writing[user_id] = batch
+                try:
+                    async with self._writers:
+                        await self.flush_fn(user_id, batch)
+                except Exception as e:
+                    unsent = batch.stop() + entries[start + self.chunk_size :]
+                    added += batch.added
+                    self._retry(user_id, unsent, generation, e)
+                    break
+                else:
+                    added += batch.added
+                finally:
+                    # A write still running on its worker stays visible to discard()
+                    if self._writing.get(user_id) is batch and not batch.in_flight:
+                        del self._writing[user_id]
+            else:
+                self._attempts.pop(user_id, None)
+                self._retry_at.pop(user_id, None)
+
+            if added:
+                self.flushed += added
+                self.batches += 1
+                if self.on_flushed is not None:
+                    self.on_flushed(user_id, added)
+        finally:
+            # Anything not added is back in _pending by now
+            self._in_flight.pop(user_id, None)
+            self._flushing.pop(user_id).set()
+
+    def _retry(self, user_id: str, entries: list[dict], generation: int, error):
+        if self._generations.get(user_id, 0) != generation or not entries:
+            return
+        attempts = self._attempts.get(user_id, 0) + 1
+        if attempts >= self.max_attempts:
+            msg.fail(
+                f"Dropping {len(entries)} interactions for user {user_id} after {attempts} attempts: {str(error)}"
+            )
+            self.dropped += len(entries)
+            self._attempts.pop(user_id, None)
+            self._retry_at.pop(user_id, None)
+            return
+
+        msg.fail(
+            f"An error occurred when flushing interactions for user {user_id}: {str(error)}"
+        )
+        self.failed += len(entries)
+        self._attempts[user_id] = attempts
+        self._retry_at[user_id] = time.monotonic() + min(
+            self.max_backoff, self.flush_interval * 2**attempts
+        )
+        # Put them back in front of anything that arrived meanwhile
+        self._pending[user_id] = entries + self._pending.get(user_id, [])
+        self._count += len(entries)
+
+    @staticmethod
+    def _coalesce(entries: list[dict]) -> list[dict]:
+        # Repeated swipes on the same card only need the latest weight
+        latest = {}
+        for entry in entries:
+            latest[(entry["item_id"], entry["interaction_property_name"])] = entry
+        return list(latest.values())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                msg.fail(f"An error occurred when flushing interactions: {str(e)}")
+
+    def _replay_spill(self):
+        if not os.path.exists(self.spill_path):
+            return
+        with open(self.spill_path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write
+                    continue
+                user_id = entry.pop("user_id")
+                self._pending.setdefault(user_id, []).append(entry)
+                self._count += 1
+        if self._count:
+            msg.info(f"Replayed {self._count} unflushed interactions")
+
+    def _rewrite_spill(self):
+        if self._spill_file is not None:
+            self._spill_rewrite = True
+            self._spill_wakeup.set()
+
+    async def _write_spill(self):
+        while True:
+            await self._spill_wakeup.wait()
+            self._spill_wakeup.clear()
+            try:
+                await self._sync_spill()
+            except Exception as e:
+                msg.fail(f"An error occurred when writing the spill file: {str(e)}")
+            if self._spill_closing:
+                return
+
+    async def _sync_spill(self):
+        if self._spill_rewrite:
+            self._spill_rewrite = False
+            # The snapshot covers every line queued so far
+            self._spill_lines = []
+            snapshot = [
+                (user_id, list(user_entries))
+                for entries in (self._pending, self._in_flight)
+                for user_id, user_entries in entries.items()
+            ]
+            await asyncio.to_thread(self._replace_spill, snapshot)
+        if self._spill_lines:
+            lines, self._spill_lines = self._spill_lines, []
+            await asyncio.to_thread(self._append_spill, lines)
+
+    def _append_spill(self, lines: list[str]):
+        self._spill_file.writelines(lines)
+        self._spill_file.flush()
+
+    def _replace_spill(self, snapshot: list[tuple[str, list[dict]]]):
+        self._spill_file.close()
+        tmp_path = f"{self.spill_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for user_id, entries in snapshot:
+                for entry in entries:
+                    file.write(json.dumps({"user_id": user_id, **entry}) + "\n")
+        os.replace(tmp_path, self.spill_path)
+        self._spill_file = open(self.spill_path, "a", encoding="utf-8")
+
+    def stats(self) -> dict:
+        return {
+            "pending": self._count,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "retrying": len(self._retry_at),
+        }
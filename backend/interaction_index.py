@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import secrets
+import time
+from collections import OrderedDict
+
+from .background import cancel_tasks
+
+
+class UserHistory:
+    __slots__ = ("entries", "epoch", "last_used")
+
+    def __init__(self, entries: list[tuple], epoch: str):
+        self.entries = entries
+        self.epoch = epoch
+        self.last_used = time.monotonic()
+
+
+class InteractionIndex:
+    """Local copy of each user's interaction history, oldest first.
+
+    A user's history is loaded from upstream once, by `load_history`, and
+    then appended to as interactions arrive, so reading it never needs
+    another remote call. Entries are (item_id, interaction_property_name,
+    weight) tuples addressed by position; `page()` hands out cursors of the
+    form "<epoch>.<position>" so clients can fetch only what is new. The
+    epoch changes whenever a history is reset or reloaded, and carries a
+    random per-process prefix so it also changes across restarts; either
+    way clients holding an older cursor start over.
+
+    At most `max_entries` are held across all users, least recently used
+    users first out, and users idle for `idle_ttl` seconds are dropped.
+    """
+
+    def __init__(
+        self, load_history, max_entries: int = 1_000_000, idle_ttl: float = 3600
+    ):
+        self.load_history = load_history
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+
+        self._users: OrderedDict[str, UserHistory] = OrderedDict()
+        self._loading: dict[str, asyncio.Task] = {}
+        self._epoch_prefix = secrets.token_hex(4)
+        self._epochs = itertools.count(1)
+        self.size = 0
+
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    async def history(self, user_id: str) -> UserHistory:
+        history = self._users.get(user_id)
+        if history is not None:
+            self.hits += 1
+            self._users.move_to_end(user_id)
+            history.last_used = time.monotonic()
+            return history
+
+        task = self._loading.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._load(user_id))
+            self._loading[user_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        return await asyncio.shield(task)
+
+    async def _load(self, user_id: str) -> UserHistory:
+        entries = list(await self.load_history(user_id))
+        self.loads += 1
+        # A reset() while loading already holds the newer history
+        return self._users.get(user_id) or self._store(user_id, entries)
+
+    def append(self, user_id: str, item_id: str, interaction: str, weight: float):
+        # Histories not loaded yet pick the interaction up when they are
+        history = self._users.get(user_id)
+        if history is None:
+            return
+        history.entries.append((item_id, interaction, weight))
+        self.size += 1
+        self._evict()
+
+    def reset(self, user_id: str):
+        """Replace a user's history with a known empty one."""
+        self._store(user_id, [])
+
+    async def stop(self):
+        await cancel_tasks(list(self._loading.values()))
+
+    def discard(self, user_id: str):
+        history = self._users.pop(user_id, None)
+        if history is not None:
+            self.size -= len(history.entries)
+
+    def page(
+        self, history: UserHistory, since: str | None, limit: int | None
+    ) -> tuple[list[tuple], str, bool, bool]:
+        """Entries after the `since` cursor, the next cursor, whether more
+        entries follow, and whether the cursor was stale so paging restarted."""
+        start = 0
+        reset = False
+        if since:
+            epoch, _, position = since.rpartition(".")
+            try:
+                position = int(position)
+            except ValueError:
+                epoch, position = None, 0
+            if epoch == history.epoch:
+                start = min(max(position, 0), len(history.entries))
+            else:
+                reset = True
+
+        end = len(history.entries) if limit is None else start + max(limit, 0)
+        entries = history.entries[start:end]
+        next_position = start + len(entries)
+        has_more = next_position < len(history.entries)
+        return entries, f"{history.epoch}.{next_position}", has_more, reset
+
+    def _store(self, user_id: str, entries: list[tuple]) -> UserHistory:
+        self.discard(user_id)
+        epoch = f"{self._epoch_prefix}-{next(self._epochs)}"
+        history = self._users[user_id] = UserHistory(entries, epoch)
+        self.size += len(entries)
+        self._evict()
+        return history
+
+    def _evict(self):
+        idle_before = time.monotonic() - self.idle_ttl
+        while len(self._users) > 1:
+            user_id, history = next(iter(self._users.items()))
+            if self.size <= self.max_entries and history.last_used >= idle_before:
+                break
+            self.discard(user_id)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._users),
+            "entries": self.size,
+            "hits": self.hits,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,374 @@
+"""In-process stand-ins for the recommender service and the Weaviate cluster.
+
+Selected with RECOMMENDER_BACKEND=local. They implement only what api.py
+calls, answer from cards loaded out of the JSONL dataset (or synthetic cards
+when no dataset is available), and can inject latency and errors so the API
+can be load tested offline and reproducibly.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from wasabi import msg  # type: ignore[import]
+
+from .card_catalog import color_mask
+from .card_records import normalize_scryfall
+
+SYNTHETIC_TYPES = [
+    "Creature — Elf Druid",
+    "Creature — Human Wizard",
+    "Instant",
+    "Sorcery",
+    "Enchantment",
+    "Artifact",
+    "Land",
+    "Planeswalker — Jace",
+]
+
+
+def synthetic_records(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        card_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        identity = [color for color in "WUBRG" if rng.random() < 0.25]
+        type_line = rng.choice(SYNTHETIC_TYPES)
+        records.append(
+            {
+                "id": card_id,
+                "oracle_id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+                "name": f"Synthetic Card {i:05d}",
+                "released_at": "2024-01-01",
+                "uri": f"https://api.scryfall.com/cards/{card_id}",
+                "scryfall_uri": f"https://scryfall.com/card/{card_id}",
+                "image_uris": {"normal": f"https://cards.scryfall.io/{card_id}.jpg"},
+                "type_line": type_line,
+                "oracle_text": f"{type_line} {i} does something useful.",
+                "colors": identity,
+                "color_identity": identity,
+                "cmc": rng.randint(0, 8),
+                "edhrec_rank": i,
+            }
+        )
+    return records
+
+
+def load_local_cards(
+    dataset_path: str | None, max_cards: int = 0, synthetic_count: int = 5000
+) -> list[dict]:
+    """Card properties from the JSONL dataset, or synthetic cards without one."""
+    if dataset_path and os.path.exists(dataset_path):
+        records = []
+        with open(dataset_path, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                records.append(json.loads(line))
+                if max_cards and len(records) >= max_cards:
+                    break
+        source = dataset_path
+    else:
+        records = synthetic_records(synthetic_count)
+        source = "synthetic cards"
+
+    cards = normalize_scryfall(records)
+    for card in cards:
+        # Weaviate returns UUID properties as uuid.UUID
+        card["card_id"] = uuid.UUID(card["card_id"])
+        if card["oracle_id"]:
+            card["oracle_id"] = uuid.UUID(card["oracle_id"])
+    msg.info(f"Local backend seeded with {len(cards)} cards from {source}")
+    return cards
+
+
+class FaultInjector:
+    def __init__(self, latency_ms: float = 0, error_rate: float = 0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> tuple[float, bool]:
+        with self._lock:
+            delay = self.latency_ms * self._rng.uniform(0.5, 1.5) / 1000
+            fail = self._rng.random() < self.error_rate
+        return delay, fail
+
+    def sync(self, name: str):
+        delay, fail = self.draw()
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"Injected error in {name}")
+
+    async def async_(self, name: str):
+        delay, fail = self.draw()
+        if delay:
+            await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError(f"Injected error in {name}")
+
+
+def required_mask(filters) -> int:
+    mask = 0
+    for config in filters or []:
+        if getattr(config, "property_name", None) == "color_identity":
+            mask |= color_mask(config.value)
+    return mask
+
+
+class LocalCardIndex:
+    def __init__(self, cards: list[dict]):
+        self.cards = cards
+        self.by_id = {str(card["card_id"]): card for card in cards}
+        self.masks = [color_mask(card["color_identity"]) for card in cards]
+
+    def sample(self, rng: random.Random, limit: int, mask: int = 0, exclude=()):
+        """Up to `limit` distinct cards matching `mask`, drawn with `rng`."""
+        exclude = set(exclude)
+        picked = []
+        seen = set()
+        # Rejection sampling keeps this cheap for the common filters
+        for _ in range(limit * 50):
+            if len(picked) >= limit or len(seen) >= len(self.cards):
+                break
+            index = rng.randrange(len(self.cards))
+            if index in seen:
+                continue
+            seen.add(index)
+            card = self.cards[index]
+            if self.masks[index] & mask == mask and str(card["card_id"]) not in exclude:
+                picked.append(card)
+        return picked
+
+
+class _LocalItemRecommendations:
+    def __init__(self, owner: "LocalRecommendClient"):
+        self.owner = owner
+
+    def from_item(self, item_id, limit=10, remove_reference=True, filters=None):
+        return self.from_items([item_id], limit, remove_reference, filters)
+
+    def from_items(self, item_ids, limit=10, remove_reference=True, filters=None):
+        self.owner.faults.sync("from_items")
+        rng = random.Random("|".join(sorted(item_ids)))
+        exclude = item_ids if remove_reference else ()
+        cards = self.owner.index.sample(rng, limit, required_mask(filters), exclude)
+        return SimpleNamespace(
+            recommendations=[SimpleNamespace(properties=card) for card in cards]
+        )
+
+    def from_user(
+        self, user_id, limit=10, remove_reference=True, top_n_interactions=100
+    ):
+        self.owner.faults.sync("from_user")
+        interactions = self.owner.interactions.get(user_id, [])
+        seen = [
+            interaction.item_id for interaction in interactions[-top_n_interactions:]
+        ]
+        rng = random.Random(f"{user_id}|{len(interactions)}")
+        exclude = seen if remove_reference else ()
+        cards = self.owner.index.sample(rng, limit, 0, exclude)
+        return SimpleNamespace(
+            recommendations=[SimpleNamespace(properties=card) for card in cards]
+        )
+
+
+class _LocalUsers:
+    def __init__(self, owner: "LocalRecommendClient"):
+        self.owner = owner
+
+    def exists(self, user_id):
+        self.owner.faults.sync("user.exists")
+        return user_id in self.owner.users
+
+    def create_user(self, user):
+        self.owner.faults.sync("user.create_user")
+        with self.owner.lock:
+            self.owner.users[user.id] = dict(user.properties)
+            self.owner.interactions.setdefault(user.id, [])
+        return f"User {user.id} created"
+
+    def get_user(self, user_id):
+        self.owner.faults.sync("user.get_user")
+        return SimpleNamespace(id=user_id, properties=dict(self.owner.users[user_id]))
+
+    def update_user(self, user):
+        self.owner.faults.sync("user.update_user")
+        with self.owner.lock:
+            self.owner.users.setdefault(user.id, {}).update(user.properties)
+        return f"User {user.id} updated"
+
+    def add_interaction(self, user_id, item_id, interaction_property_name, weight):
+        self.owner.faults.sync("user.add_interaction")
+        with self.owner.lock:
+            self.owner.interactions.setdefault(user_id, []).append(
+                SimpleNamespace(
+                    item_id=item_id,
+                    interaction_property_name=interaction_property_name,
+                    weight=weight,
+                )
+            )
+        return "Interaction added"
+
+    def get_user_interactions(self, user_id):
+        self.owner.faults.sync("user.get_user_interactions")
+        return list(self.owner.interactions.get(user_id, []))
+
+    def delete_all_interactions(self, user_id):
+        self.owner.faults.sync("user.delete_all_interactions")
+        with self.owner.lock:
+            self.owner.interactions[user_id] = []
+        return "Interactions deleted"
+
+
+class LocalRecommendClient:
+    """Stand-in for WeaviateRecommendClient with in-memory users and interactions."""
+
+    def __init__(self, cards: list[dict], faults: FaultInjector):
+        self.index = LocalCardIndex(cards)
+        self.faults = faults
+        self.lock = threading.Lock()
+        self.users: dict[str, dict] = {}
+        self.interactions: dict[str, list] = {}
+        self.recommendation = SimpleNamespace(item=_LocalItemRecommendations(self))
+        self.user = _LocalUsers(self)
+
+    def search(self, text, user_id=None, limit=10, influence_factor=0, filters=None):
+        self.faults.sync("search")
+        terms = text.lower().split()
+        mask = required_mask(filters)
+        results = []
+        for card, card_mask in zip(self.index.cards, self.index.masks):
+            if card_mask & mask != mask:
+                continue
+            haystack = (
+                f"{card['name']} {card['type_line']} {card['oracle_text']}".lower()
+            )
+            if all(term in haystack for term in terms):
+                results.append(card)
+                if len(results) >= limit:
+                    break
+        return SimpleNamespace(
+            results=[SimpleNamespace(properties=card) for card in results]
+        )
+
+    def train_status(self):
+        self.faults.sync("train_status")
+        return SimpleNamespace(status="trained")
+
+    def is_training(self):
+        return False
+
+
+class _LocalQuery:
+    def __init__(self, collection: "_LocalCollection"):
+        self.collection = collection
+
+    async def fetch_objects(
+        self, limit=None, offset=None, after=None, return_properties=None, **_
+    ):
+        await self.collection.faults.async_("fetch_objects")
+        objects = self.collection.objects
+        start = offset or 0
+        if after is not None:
+            start = self.collection.positions[str(after)] + 1
+        end = len(objects) if limit is None else start + limit
+        return SimpleNamespace(
+            objects=[
+                self.collection.project(o, return_properties)
+                for o in objects[start:end]
+            ]
+        )
+
+    async def fetch_objects_by_ids(self, ids, limit=None, return_properties=None, **_):
+        await self.collection.faults.async_("fetch_objects_by_ids")
+        objects = []
+        for card_id in ids:
+            position = self.collection.positions.get(str(card_id))
+            if position is not None:
+                objects.append(
+                    self.collection.project(
+                        self.collection.objects[position], return_properties
+                    )
+                )
+        return SimpleNamespace(objects=objects[:limit])
+
+
+class _LocalAggregate:
+    def __init__(self, collection: "_LocalCollection"):
+        self.collection = collection
+
+    async def over_all(self, total_count=True):
+        await self.collection.faults.async_("aggregate")
+        return SimpleNamespace(total_count=len(self.collection.objects))
+
+
+class _LocalCollection:
+    def __init__(self, cards: list[dict], faults: FaultInjector):
+        self.faults = faults
+        # Cursor pagination walks objects in uuid order, like Weaviate does
+        self.objects = sorted(
+            (SimpleNamespace(uuid=card["card_id"], properties=card) for card in cards),
+            key=lambda o: str(o.uuid),
+        )
+        self.positions = {str(o.uuid): i for i, o in enumerate(self.objects)}
+        self.query = _LocalQuery(self)
+        self.aggregate = _LocalAggregate(self)
+
+    @staticmethod
+    def project(obj, return_properties):
+        if not return_properties:
+            return obj
+        return SimpleNamespace(
+            uuid=obj.uuid,
+            properties={
+                name: obj.properties[name]
+                for name in return_properties
+                if name in obj.properties
+            },
+        )
+
+
+class LocalWeaviateClient:
+    """Stand-in for the async Weaviate client with a single card collection."""
+
+    def __init__(self, cards: list[dict], faults: FaultInjector):
+        self._collection = _LocalCollection(cards, faults)
+        self.collections = SimpleNamespace(get=lambda name: self._collection)
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def create_local_clients():
+    """Both stand-ins, configured from LOCAL_* environment variables."""
+    cards = load_local_cards(
+        os.getenv("LOCAL_DATASET", "dataset/all_cards.jsonl"),
+        max_cards=int(os.getenv("LOCAL_MAX_CARDS", 0)),
+        synthetic_count=int(os.getenv("LOCAL_SYNTHETIC_CARDS", 5000)),
+    )
+    seed = int(os.getenv("LOCAL_SEED", 0))
+    recommender_faults = FaultInjector(
+        latency_ms=float(os.getenv("LOCAL_RECOMMENDER_LATENCY_MS", 50)),
+        error_rate=float(os.getenv("LOCAL_RECOMMENDER_ERROR_RATE", 0)),
+        seed=seed,
+    )
+    weaviate_faults = FaultInjector(
+        latency_ms=float(os.getenv("LOCAL_WEAVIATE_LATENCY_MS", 10)),
+        error_rate=float(os.getenv("LOCAL_WEAVIATE_ERROR_RATE", 0)),
+        seed=seed + 1,
+    )
+    return (
+        LocalRecommendClient(cards, recommender_faults),
+        LocalWeaviateClient(cards, weaviate_faults),
+    )
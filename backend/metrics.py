@@ -0,0 +1,166 @@
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; everything slower lands in +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        index = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            index += 1
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    """Request and upstream latency histograms, error counters and component stats.
+
+    Everything is updated from the event loop, so no locking is needed.
+    `render()` produces the Prometheus text exposition format for /metrics.
+    """
+
+    def __init__(self, namespace: str = "magic"):
+        self.namespace = namespace
+        self.histograms: dict[str, dict[tuple, Histogram]] = {}
+        self.counters: dict[str, dict[tuple, float]] = {}
+        self.help: dict[str, str] = {}
+        self.collectors: dict[str, object] = {}
+
+    def observe(self, name: str, value: float, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = tuple(labels.items())
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = tuple(labels.items())
+        series[key] = series.get(key, 0) + amount
+
+    def record_request(self, method: str, path: str, status: int, seconds: float):
+        self.observe("http_request_duration_seconds", seconds, method=method, path=path)
+        self.increment(
+            "http_requests_total", method=method, path=path, status=str(status)
+        )
+        if status >= 400:
+            self.increment("http_request_errors_total", method=method, path=path)
+
+    def record_upstream(
+        self, upstream: str, operation: str, seconds: float, failed: bool = False
+    ):
+        self.observe(
+            "upstream_duration_seconds",
+            seconds,
+            upstream=upstream,
+            operation=operation,
+        )
+        if failed:
+            self.increment(
+                "upstream_errors_total", upstream=upstream, operation=operation
+            )
+
+    @contextmanager
+    def span(self, upstream: str, operation: str):
+        """Time one upstream call; an exception counts it as an error."""
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.record_upstream(
+                upstream, operation, time.perf_counter() - start, failed
+            )
+
+    def register(self, component: str, stats):
+        """Export the numeric values of `stats()` as gauges on every scrape."""
+        self.collectors[component] = stats
+
+    def render(self) -> str:
+        lines = []
+        for name, series in self.histograms.items():
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {full_name} histogram")
+            for labels, histogram in series.items():
+                cumulative = 0
+                bounds = [*map(str, histogram.buckets), "+Inf"]
+                for bound, count in zip(bounds, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f"{full_name}_bucket{_labels(labels + (('le', bound),))} {cumulative}"
+                    )
+                lines.append(f"{full_name}_sum{_labels(labels)} {histogram.sum}")
+                lines.append(f"{full_name}_count{_labels(labels)} {histogram.count}")
+
+        for name, series in self.counters.items():
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# TYPE {full_name} counter")
+            for labels, value in series.items():
+                lines.append(f"{full_name}{_labels(labels)} {value}")
+
+        for component, stats in self.collectors.items():
+            for key, value in stats().items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                full_name = f"{self.namespace}_{component}_{key}"
+                lines.append(f"# TYPE {full_name} gauge")
+                lines.append(f"{full_name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class TimingMiddleware:
+    """ASGI middleware recording latency and status per route template."""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route template keeps label cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            self.metrics.record_request(
+                scope["method"], path, status, time.perf_counter() - start
+            )
@@ -0,0 +1,112 @@
+import math
+
+from .card_catalog import mask_colors
+
+
+class FilterStats:
+    __slots__ = ("hit_rate", "requests", "rounds", "fetched", "kept", "shortfalls")
+
+    def __init__(self, hit_rate: float):
+        self.hit_rate = hit_rate
+        self.requests = 0
+        self.rounds = 0
+        self.fetched = 0
+        self.kept = 0
+        self.shortfalls = 0
+
+
+class AdaptiveOverfetch:
+    """Color-filtered results from an upstream call that cannot filter itself.
+
+    Asks for roughly `limit / hit_rate` candidates, keeps those whose color
+    mask contains every required color and that `exclude` does not reject,
+    and stops as soon as `limit` are kept, doubling the request while it
+    comes up short. The hit rate per filter starts from `prior(required)`
+    and follows what is actually observed.
+    """
+
+    def __init__(
+        self,
+        card_mask,
+        prior,
+        max_fetch: int = 200,
+        min_hit_rate: float = 0.02,
+        smoothing: float = 0.2,
+        headroom: float = 1.25,
+    ):
+        self.card_mask = card_mask
+        self.prior = prior
+        self.max_fetch = max_fetch
+        self.min_hit_rate = min_hit_rate
+        self.smoothing = smoothing
+        self.headroom = headroom
+
+        self.filters: dict[int, FilterStats] = {}
+
+    def fetch_limit(self, required: int, limit: int) -> int:
+        stats = self._stats(required)
+        rate = max(stats.hit_rate, self.min_hit_rate)
+        return max(limit, min(self.max_fetch, math.ceil(limit * self.headroom / rate)))
+
+    async def fetch(self, required: int, limit: int, fetch, exclude=None) -> list[dict]:
+        stats = self._stats(required)
+        stats.requests += 1
+        fetch_limit = self.fetch_limit(required, limit)
+
+        while True:
+            candidates = await fetch(fetch_limit)
+            stats.rounds += 1
+
+            kept = []
+            examined = 0
+            for card in candidates:
+                examined += 1
+                if self.card_mask(card) & required != required:
+                    continue
+                if exclude is None or not exclude(card):
+                    kept.append(card)
+                    if len(kept) == limit:
+                        break
+            self._observe(stats, len(kept), examined)
+
+            if (
+                len(kept) >= limit
+                or len(candidates) < fetch_limit
+                or fetch_limit >= self.max_fetch
+            ):
+                if len(kept) < limit:
+                    stats.shortfalls += 1
+                return kept
+            fetch_limit = min(self.max_fetch, fetch_limit * 2)
+
+    def _stats(self, required: int) -> FilterStats:
+        stats = self.filters.get(required)
+        if stats is None:
+            stats = self.filters[required] = FilterStats(self.prior(required))
+        return stats
+
+    def _observe(self, stats: FilterStats, kept: int, examined: int):
+        if examined == 0:
+            return
+        stats.fetched += examined
+        stats.kept += kept
+        stats.hit_rate += self.smoothing * (kept / examined - stats.hit_rate)
+
+    def stats(self) -> dict:
+        return {
+            "requests": sum(stats.requests for stats in self.filters.values()),
+            "rounds": sum(stats.rounds for stats in self.filters.values()),
+            "shortfalls": sum(stats.shortfalls for stats in self.filters.values()),
+            "filters": {
+                "".join(mask_colors(required))
+                or "any": {
+                    "hit_rate": stats.hit_rate,
+                    "requests": stats.requests,
+                    "rounds": stats.rounds,
+                    "fetched": stats.fetched,
+                    "kept": stats.kept,
+                    "shortfalls": stats.shortfalls,
+                }
+                for required, stats in self.filters.items()
+            },
+        }
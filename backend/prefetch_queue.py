@@ -0,0 +1,220 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+
+from wasabi import msg  # type: ignore[import]
+
+from .background import cancel_tasks
+
+
+class PrefetchSession:
+    __slots__ = (
+        "cards",
+        "required",
+        "depth",
+        "read",
+        "seen",
+        "seen_order",
+        "last_used",
+        "task",
+        "stale",
+    )
+
+    def __init__(self, depth: int):
+        self.cards: deque = deque()
+        self.required = 0
+        self.depth = depth
+        self.read = False
+        self.seen: set[str] = set()
+        self.seen_order: deque = deque()
+        self.last_used = time.monotonic()
+        self.task: asyncio.Task | None = None
+        self.stale = False
+
+
+class RecommendationPrefetcher:
+    """Per-user queues of upcoming from_user recommendations.
+
+    The next `depth` recommendations are fetched in the background, so a swipe
+    can usually be answered from the queue without a recommender round trip.
+    A session queues at least as many cards as its client asks for at once,
+    up to `max_depth`, for the color filter it was last asked for: the queue
+    is refilled through `fetch(user_id, limit, required)` with that color
+    mask, so filtered requests hit as often as unfiltered ones. Cards
+    already served or interacted with are never
+    queued again. Sessions are dropped after `idle_ttl` seconds without use,
+    and at most `max_users` are kept, least recently used first out.
+    """
+
+    def __init__(
+        self,
+        fetch,
+        depth: int = 10,
+        max_depth: int = 50,
+        low_watermark: int = 3,
+        max_users: int = 10000,
+        idle_ttl: float = 900,
+        max_seen: int = 500,
+    ):
+        self.fetch = fetch
+        self.depth = depth
+        self.max_depth = max_depth
+        self.low_watermark = low_watermark
+        self.max_users = max_users
+        self.idle_ttl = idle_ttl
+        self.max_seen = max_seen
+
+        self._sessions: OrderedDict[str, PrefetchSession] = OrderedDict()
+
+        self.hits = 0
+        self.partial = 0
+        self.misses = 0
+        self.refills = 0
+        self.failed = 0
+        self.evictions = 0
+
+    def take(self, user_id: str, k: int, required: int = 0) -> list[dict]:
+        """Up to `k` queued cards with all `required` colors, best first.
+
+        The caller fetches whatever is missing and reports it with `served()`.
+        """
+        session = self._session(user_id)
+        session.depth = max(session.depth, min(k, self.max_depth))
+        if session.required != required:
+            # One filter is queued at a time, the one the client uses now
+            session.required = required
+            session.cards.clear()
+        cards = list(islice(session.cards, k))
+
+        if len(cards) == k:
+            self.hits += 1
+        elif cards:
+            self.partial += 1
+        else:
+            self.misses += 1
+
+        if cards:
+            for _ in cards:
+                session.cards.popleft()
+            self._mark_seen(session, [card["card_id"] for card in cards])
+            session.read = True
+        if len(session.cards) < max(self.low_watermark, k):
+            self._schedule(user_id, session)
+        return cards
+
+    def served(self, user_id: str, cards: list[dict]):
+        """Record cards served without the queue so they are not queued again."""
+        session = self._sessions.get(user_id)
+        if session is not None:
+            self._mark_seen(session, [card["card_id"] for card in cards])
+
+    def mark_seen(self, user_id: str, card_id: str):
+        session = self._sessions.get(user_id)
+        if session is None:
+            return
+        self._mark_seen(session, [card_id])
+        if any(card["card_id"] == card_id for card in session.cards):
+            session.cards = deque(
+                card for card in session.cards if card["card_id"] != card_id
+            )
+
+    def refresh(self, user_id: str):
+        """Refetch a user's queue, e.g. once their new interactions are upstream.
+
+        Only queues read from since their last fetch are worth the round trip.
+        """
+        session = self._sessions.get(user_id)
+        if session is not None and session.read:
+            self._schedule(user_id, session)
+
+    def discard(self, user_id: str):
+        session = self._sessions.pop(user_id, None)
+        if session is not None and session.task is not None:
+            session.task.cancel()
+
+    async def stop(self):
+        await cancel_tasks([session.task for session in self._sessions.values()])
+
+    def _session(self, user_id: str) -> PrefetchSession:
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = PrefetchSession(self.depth)
+        else:
+            self._sessions.move_to_end(user_id)
+        session.last_used = time.monotonic()
+        self._evict()
+        return session
+
+    def _evict(self):
+        idle_before = time.monotonic() - self.idle_ttl
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if len(self._sessions) <= self.max_users and (
+                session.last_used >= idle_before
+            ):
+                break
+            self.discard(user_id)
+            self.evictions += 1
+
+    def _mark_seen(self, session: PrefetchSession, card_ids: list[str]):
+        for card_id in card_ids:
+            if card_id in session.seen:
+                continue
+            session.seen.add(card_id)
+            session.seen_order.append(card_id)
+        while len(session.seen_order) > self.max_seen:
+            session.seen.discard(session.seen_order.popleft())
+
+    def _schedule(self, user_id: str, session: PrefetchSession):
+        if session.task is not None:
+            # Fetch again once the running refill is done
+            session.stale = True
+            return
+        session.task = asyncio.create_task(self._refill(user_id, session))
+
+    async def _refill(self, user_id: str, session: PrefetchSession):
+        try:
+            while True:
+                session.stale = False
+                session.read = False
+                required = session.required
+                # Served cards the user has not swiped yet still rank at the top
+                limit = min(session.depth + len(session.seen), session.depth * 5)
+                cards = await self.fetch(user_id, limit, required)
+                self.refills += 1
+                if session.required != required:
+                    # The filter changed meanwhile; these cards are for the old one
+                    continue
+
+                queued = []
+                queued_ids = set()
+                for card in cards:
+                    card_id = card["card_id"]
+                    if card_id not in session.seen and card_id not in queued_ids:
+                        queued.append(card)
+                        queued_ids.add(card_id)
+                        if len(queued) >= session.depth:
+                            break
+                session.cards = deque(queued)
+
+                if not session.stale:
+                    break
+        except Exception as e:
+            self.failed += 1
+            msg.fail(f"An error occurred while prefetching recommendations: {str(e)}")
+        finally:
+            session.task = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.partial + self.misses
+        return {
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "partial": self.partial,
+            "misses": self.misses,
+            "refills": self.refills,
+            "failed": self.failed,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RecommenderBusyError(Exception):
+    pass
+
+
+class RecommenderTimeoutError(Exception):
+    pass
+
+
+class AsyncRecommenderClient:
+    """Runs blocking WeaviateRecommendClient calls on a bounded thread pool.
+
+    At most `max_workers` calls run at once and at most `max_queue` more wait
+    for a worker. When both are full, callers wait up to `acquire_timeout`
+    seconds for a slot and then get a RecommenderBusyError instead of piling
+    up behind a slow upstream.
+
+    `observe(operation, seconds, failed)` is called after every call, including
+    rejected and timed-out ones, with the time spent waiting and running.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_workers: int = 8,
+        max_queue: int = 32,
+        timeout: float = 10.0,
+        acquire_timeout: float = 0.5,
+        observe=None,
+    ):
+        self.client = client
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.observe = observe
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="recommender"
+        )
+        self._slots = asyncio.Semaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+
+        self._queued = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    async def run(self, fn, *args, timeout: float | None = None, **kwargs):
+        if self.observe is None:
+            return await self._run(fn, args, kwargs, timeout)
+
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = await self._run(fn, args, kwargs, timeout)
+            failed = False
+            return result
+        finally:
+            self.observe(
+                getattr(fn, "__name__", "call"), time.perf_counter() - start, failed
+            )
+
+    async def _run(self, fn, args, kwargs, timeout: float | None):
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self._rejected += 1
+            raise RecommenderBusyError(
+                f"Recommender pool saturated ({self.max_workers} running, {self.max_queue} queued)"
+            )
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._queued += 1
+
+        try:
+            future = self._executor.submit(self._call, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda f: self._on_done(loop, f))
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            self._timed_out += 1
+            raise RecommenderTimeoutError(
+                f"{getattr(fn, '__name__', 'call')} timed out after {timeout or self.timeout} seconds"
+            )
+
+    def _call(self, fn, args, kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._in_flight += 1
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        with self._lock:
+            self._completed += 1
+        return result
+
+    def _on_done(self, loop, future):
+        if future.cancelled():
+            # Timed out before a worker picked it up, so _call never ran
+            with self._lock:
+                self._queued -= 1
+        # The slot is only freed once the worker is really done with the call
+        try:
+            loop.call_soon_threadsafe(self._slots.release)
+        except RuntimeError:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pool_size": self.max_workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queue_depth": self._queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
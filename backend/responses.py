@@ -0,0 +1,48 @@
+import datetime
+import json
+import uuid
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # type: ignore[import]
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode a response body with orjson when installed, otherwise with the stdlib.
+
+    Both paths handle UUID and datetime values natively.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def project(cards: list[dict], fields: list[str] | None) -> list[dict]:
+    """Keep only the requested card fields; card_id is always kept."""
+    if not fields:
+        return cards
+    keys = ["card_id"] + [field for field in fields if field != "card_id"]
+    return [{key: card[key] for key in keys if key in card} for card in cards]
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from wasabi import msg  # type: ignore[import]
+
+from .background import cancel_tasks
+
+
+def estimate_size(value) -> int:
+    if isinstance(value, str):
+        return 49 + len(value)
+    if isinstance(value, dict):
+        return 64 + sum(
+            estimate_size(key) + estimate_size(item) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return 56 + sum(estimate_size(item) for item in value)
+    return 32
+
+
+class CacheEntry:
+    __slots__ = ("value", "size", "fresh_until", "stale_until", "version", "tag")
+
+    def __init__(
+        self,
+        value,
+        size: int,
+        fresh_until: float,
+        stale_until: float,
+        version: int,
+        tag=None,
+    ):
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.version = version
+        self.tag = tag
+
+
+class ResultCache:
+    """LRU cache of upstream results bounded by an estimated memory budget.
+
+    Entries are fresh for `ttl` seconds. After that they are still served for
+    up to `stale_ttl` seconds while a background task recomputes them. All
+    entries are dropped when the upstream model version changes. Entries can
+    carry a tag (e.g. a user id) so related results are dropped together.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 300,
+        stale_ttl: float = 3600,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self._entries: OrderedDict = OrderedDict()
+        self._tags: dict = {}
+        # Tags with computations in flight, and when each was last discarded
+        self._pending: dict = {}
+        self._discarded: dict = {}
+        self._revalidating: set = set()
+        self._tasks: set[asyncio.Task] = set()
+        self.size = 0
+        self.version = 0
+        self.model_version = None
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_compute(self, key, compute, tag=None):
+        entry = self._entries.get(key)
+        now = time.monotonic()
+
+        if entry is not None and entry.version == self.version:
+            if now < entry.fresh_until:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.value
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                self._revalidate(key, compute, tag)
+                return entry.value
+
+        self.misses += 1
+        return await self._compute(key, compute, tag)
+
+    async def _compute(self, key, compute, tag):
+        version = self.version
+        if tag is None:
+            value = await compute()
+            # Results computed against an older model are thrown away
+            if version == self.version:
+                self.set(key, value)
+            return value
+
+        started = time.monotonic()
+        self._pending[tag] = self._pending.get(tag, 0) + 1
+        try:
+            value = await compute()
+            # Likewise for results started before their tag was discarded
+            if version == self.version and self._discarded.get(tag, -1.0) < started:
+                self.set(key, value, tag)
+            return value
+        finally:
+            self._pending[tag] -= 1
+            if not self._pending[tag]:
+                del self._pending[tag]
+                self._discarded.pop(tag, None)
+
+    def set(self, key, value, tag=None):
+        self.discard(key)
+
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+
+        now = time.monotonic()
+        self._entries[key] = CacheEntry(
+            value,
+            size,
+            now + self.ttl,
+            now + self.ttl + self.stale_ttl,
+            self.version,
+            tag,
+        )
+        self.size += size
+        if tag is not None:
+            self._tags.setdefault(tag, set()).add(key)
+        while self.size > self.max_bytes:
+            evicted_key, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self._untag(evicted_key, evicted)
+            self.evictions += 1
+
+    def discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry.size
+            self._untag(key, entry)
+
+    def discard_tag(self, tag) -> int:
+        if tag in self._pending:
+            self._discarded[tag] = time.monotonic()
+        keys = self._tags.pop(tag, ())
+        for key in keys:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.size -= entry.size
+        return len(keys)
+
+    def _untag(self, key, entry: CacheEntry):
+        if entry.tag is None:
+            return
+        keys = self._tags.get(entry.tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[entry.tag]
+
+    def invalidate(self):
+        self._entries.clear()
+        self._tags.clear()
+        self.size = 0
+        self.version += 1
+
+    def set_model_version(self, model_version):
+        if model_version == self.model_version:
+            return
+        if self.model_version is not None:
+            msg.info(
+                f"Model version changed to {model_version}, clearing cached results"
+            )
+            self.invalidate()
+        self.model_version = model_version
+
+    async def stop(self):
+        await cancel_tasks(list(self._tasks))
+
+    def _revalidate(self, key, compute, tag=None):
+        if key in self._revalidating:
+            return
+        self._revalidating.add(key)
+
+        async def refresh():
+            try:
+                await self._compute(key, compute, tag)
+            except Exception as e:
+                msg.fail(
+                    f"An error occurred while revalidating cached results: {str(e)}"
+                )
+            finally:
+                self._revalidating.discard(key)
+
+        task = asyncio.create_task(refresh())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
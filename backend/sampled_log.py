@@ -0,0 +1,42 @@
+import random
+
+from wasabi import msg  # type: ignore[import]
+
+LEVELS = {"debug": 10, "info": 20, "warn": 30, "error": 40}
+
+
+class SampledLog:
+    """Level-gated wasabi logging for per-request lines.
+
+    Messages below `level` are dropped. Debug and info lines are additionally
+    sampled at `sample_rate`, so busy endpoints can stay quiet under load.
+    Warnings and failures are never sampled.
+    """
+
+    def __init__(self, level: str = "info", sample_rate: float = 1.0):
+        self.level = LEVELS.get(level.lower(), LEVELS["info"])
+        self.sample_rate = sample_rate
+
+    def _sampled(self, level: int) -> bool:
+        if level < self.level:
+            return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def debug(self, text: str):
+        if self._sampled(LEVELS["debug"]):
+            msg.text(text)
+
+    def info(self, text: str):
+        if self._sampled(LEVELS["info"]):
+            msg.info(text)
+
+    def good(self, text: str):
+        if self._sampled(LEVELS["info"]):
+            msg.good(text)
+
+    def warn(self, text: str):
+        if self.level <= LEVELS["warn"]:
+            msg.warn(text)
+
+    def fail(self, text: str):
+        msg.fail(text)
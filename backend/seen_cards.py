@@ -0,0 +1,208 @@
+import asyncio
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from wasabi import msg  # type: ignore[import]
+
+from .background import cancel_tasks
+from .card_catalog import CardCatalog
+
+
+class SeenEntry:
+    __slots__ = ("bits", "count", "warmed", "retry_at", "last_used")
+
+    def __init__(self, size: int):
+        self.bits = bytearray((size + 7) // 8)
+        self.count = 0
+        self.warmed = False
+        self.retry_at = 0.0
+        self.last_used = time.monotonic()
+
+
+def unseen_positions(
+    offset: int, limit: int, skipped: list[int], total: int
+) -> list[int]:
+    """Positions `offset` to `offset + limit` of a 0..total sequence without `skipped`.
+
+    `skipped` must be sorted, so the cost depends on its length and not on
+    how far into the sequence the page is.
+    """
+    position = max(offset, 0)
+    index = 0
+    # Every skipped position at or before the target pushes it one further
+    while index < len(skipped) and skipped[index] <= position:
+        position += 1
+        index += 1
+
+    positions = []
+    while position < total and len(positions) < limit:
+        if index < len(skipped) and skipped[index] == position:
+            index += 1
+        else:
+            positions.append(position)
+        position += 1
+    return positions
+
+
+class SeenCards:
+    """Per-user bitmaps over catalog ordinals of the cards a user has swiped.
+
+    A bitmap costs one bit per catalog card (under 4 KB for 30k cards), and
+    users are evicted least recently used first once `max_bytes` is reached
+    or after `idle_ttl` seconds without use. Bitmaps are seeded from the
+    upstream interaction history once per user, in the background; `ready()`
+    waits up to `warm_timeout` seconds for that so a user's first listing is
+    filtered too. They are dropped whenever the catalog is reloaded, since
+    ordinals may shift.
+    """
+
+    def __init__(
+        self,
+        catalog: CardCatalog,
+        load_history,
+        max_bytes: int = 64 * 1024 * 1024,
+        idle_ttl: float = 3600,
+        retry_interval: float = 60,
+        warm_timeout: float = 0.25,
+    ):
+        self.catalog = catalog
+        self.load_history = load_history
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+        self.retry_interval = retry_interval
+        self.warm_timeout = warm_timeout
+
+        self._users: OrderedDict[str, SeenEntry] = OrderedDict()
+        self._catalog_version = None
+        self._warming: dict[str, asyncio.Task] = {}
+        self.size = 0
+        self.evictions = 0
+
+    def add(self, user_id: str, card_ids):
+        entry = self._entry(user_id)
+        if entry is None:
+            return
+        for card_id in card_ids:
+            ordinal = self.catalog.ordinals.get(card_id)
+            if ordinal is None:
+                continue
+            byte, bit = divmod(ordinal, 8)
+            if not entry.bits[byte] & (1 << bit):
+                entry.bits[byte] |= 1 << bit
+                entry.count += 1
+
+    def excluder(self, user_id: str):
+        """A predicate for cards the user has seen, or None if there are none."""
+        entry = self._entry(user_id, create=False)
+        if entry is None or not entry.count:
+            return None
+        bits = entry.bits
+        ordinals = self.catalog.ordinals
+
+        def seen(card: dict) -> bool:
+            ordinal = ordinals.get(card["card_id"])
+            return ordinal is not None and bool(
+                bits[ordinal >> 3] & (1 << (ordinal & 7))
+            )
+
+        return seen
+
+    def ordinals(self, user_id: str) -> list[int]:
+        """Sorted catalog ordinals of the cards the user has seen."""
+        entry = self._entry(user_id, create=False)
+        if entry is None or not entry.count:
+            return []
+        ordinals = []
+        for byte_index, byte in enumerate(entry.bits):
+            if byte:
+                base = byte_index * 8
+                ordinals.extend(base + bit for bit in range(8) if byte & (1 << bit))
+        return ordinals
+
+    def card_ids(self, user_id: str) -> set[str]:
+        return {self.catalog.card_ids[ordinal] for ordinal in self.ordinals(user_id)}
+
+    def skipped_positions(self, user_id: str, candidates) -> list[int]:
+        """Sorted positions in the sorted `candidates` of cards the user has seen."""
+        positions = []
+        for ordinal in self.ordinals(user_id):
+            position = bisect_left(candidates, ordinal)
+            if position < len(candidates) and candidates[position] == ordinal:
+                positions.append(position)
+        return positions
+
+    def warm(self, user_id: str):
+        """Seed the user's bitmap from the upstream history if not done yet."""
+        entry = self._entry(user_id)
+        if entry is None or entry.warmed or user_id in self._warming:
+            return
+        if entry.retry_at > time.monotonic():
+            return
+        task = asyncio.create_task(self._warm(user_id, entry))
+        self._warming[user_id] = task
+        task.add_done_callback(lambda _: self._warming.pop(user_id, None))
+
+    async def ready(self, user_id: str):
+        """Warm the user's bitmap, waiting up to `warm_timeout` seconds for it."""
+        self.warm(user_id)
+        task = self._warming.get(user_id)
+        if task is not None:
+            # Past the timeout the listing goes out filtered by what is known
+            await asyncio.wait([task], timeout=self.warm_timeout)
+
+    async def _warm(self, user_id: str, entry: SeenEntry):
+        try:
+            card_ids = await self.load_history(user_id)
+            if self._users.get(user_id) is entry:
+                self.add(user_id, card_ids)
+                entry.warmed = True
+        except Exception as e:
+            entry.retry_at = time.monotonic() + self.retry_interval
+            msg.fail(f"An error occurred while loading seen cards: {str(e)}")
+
+    async def stop(self):
+        await cancel_tasks(list(self._warming.values()))
+
+    def discard(self, user_id: str):
+        entry = self._users.pop(user_id, None)
+        if entry is not None:
+            self.size -= len(entry.bits)
+        task = self._warming.pop(user_id, None)
+        if task is not None:
+            task.cancel()
+
+    def _entry(self, user_id: str, create: bool = True) -> SeenEntry | None:
+        if not self.catalog.loaded:
+            return None
+        if self._catalog_version != self.catalog.version:
+            self._users.clear()
+            self.size = 0
+            self._catalog_version = self.catalog.version
+
+        entry = self._users.get(user_id)
+        if entry is not None:
+            self._users.move_to_end(user_id)
+        elif create:
+            entry = self._users[user_id] = SeenEntry(len(self.catalog))
+            self.size += len(entry.bits)
+            self._evict()
+        if entry is not None:
+            entry.last_used = time.monotonic()
+        return entry
+
+    def _evict(self):
+        idle_before = time.monotonic() - self.idle_ttl
+        while len(self._users) > 1:
+            user_id, entry = next(iter(self._users.items()))
+            if self.size <= self.max_bytes and entry.last_used >= idle_before:
+                break
+            self.discard(user_id)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._users),
+            "bytes": self.size,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,49 @@
+import asyncio
+
+from .background import cancel_tasks
+
+
+class SingleFlight:
+    """Lets concurrent identical upstream calls share one in-flight result.
+
+    The first caller for a key starts the call as a task; everyone asking for
+    the same key before it finishes awaits that task instead of calling again.
+    Nothing is kept once the call completes, so results are never stale.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, fn):
+        self.calls += 1
+
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        # Shielded so one caller going away does not cancel the call for the rest
+        return await asyncio.shield(task)
+
+    async def stop(self):
+        await cancel_tasks(list(self._calls.values()))
+
+    def _forget(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved in case every waiter went away
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+            "dedup_ratio": self.shared / self.calls if self.calls else 0.0,
+        }
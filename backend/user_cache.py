@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+
+class KnownUserCache:
+    """Bounded LRU/TTL set of user ids already known to exist upstream.
+
+    Concurrent checks for the same unknown user share a single call to
+    `ensure_fn`, so a new user's first burst of requests creates it only once.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._users: OrderedDict[str, float] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, user_id: str) -> bool:
+        expires_at = self._users.get(user_id)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._users[user_id]
+            return False
+        self._users.move_to_end(user_id)
+        return True
+
+    def add(self, user_id: str):
+        self._users[user_id] = time.monotonic() + self.ttl
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+
+    def discard(self, user_id: str):
+        self._users.pop(user_id, None)
+
+    async def ensure(self, user_id: str, ensure_fn):
+        if user_id in self:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        while True:
+            pending = self._pending.get(user_id)
+            if pending is None:
+                break
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The caller creating the user went away; take over unless
+                # someone else already has or it finished in the meantime
+                if user_id in self:
+                    return
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[user_id] = future
+        try:
+            await ensure_fn(user_id)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark the exception as retrieved in case nobody else was waiting
+                future.exception()
+            raise
+        else:
+            self.add(user_id)
+            future.set_result(None)
+        finally:
+            del self._pending[user_id]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._users),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -2,6 +2,17 @@ import requests
 import json
 from tqdm import tqdm
 import time
+import argparse
+import codecs
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+
+# Characters a number can continue with in the next chunk
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+# How far before the end of the buffer a decode error can still be a cut-off token
+TRUNCATION_SLACK = 16
 
 
 def get_bulk_data():
@@ -10,6 +21,115 @@ def get_bulk_data():
     return response.json()
 
 
+def iter_json_array(chunks, max_element_size=64 * 1024 * 1024):
+    """Yield the elements of a top-level JSON array from an iterable of byte chunks.
+
+    Only the current chunk and the element being decoded are held in memory,
+    so the size of the whole array does not matter. An element that does not
+    decode once more than `max_element_size` characters are buffered for it
+    is treated as a syntax error.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    position = 0
+    started = False
+    exhausted = False
+    chunks = iter(chunks)
+
+    while True:
+        # Skip whitespace and separators up to the next element
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if not started and position < len(buffer):
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array")
+            started = True
+            position += 1
+            continue
+        if started and position < len(buffer) and buffer[position] == "]":
+            return
+
+        if position < len(buffer):
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if exhausted or not _may_be_truncated(buffer, e):
+                    raise
+            else:
+                if exhausted or not _may_continue(element, buffer, end):
+                    yield element
+                    position = end
+                    continue
+
+        if exhausted:
+            raise ValueError("Unexpected end of JSON array")
+        if len(buffer) - position > max_element_size:
+            raise ValueError(
+                f"JSON array element at character {position} does not decode "
+                f"within {max_element_size} characters"
+            )
+
+        # Need more data: drop what was consumed and read the next chunk
+        buffer = buffer[position:]
+        position = 0
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buffer += utf8.decode(b"", final=True)
+        else:
+            buffer += utf8.decode(chunk)
+
+
+def _may_continue(element, buffer, end):
+    # A number that runs up to the end of the buffer (or into a cut-off
+    # fraction or exponent) may have more digits in the next chunk
+    if isinstance(element, bool) or not isinstance(element, (int, float)):
+        return False
+    return all(char in NUMBER_CHARS for char in buffer[end:])
+
+
+def _may_be_truncated(buffer, error):
+    # A string may legitimately run past the end of the buffer; anything else
+    # cut off by the chunk boundary fails right at the end of it
+    if error.msg.startswith("Unterminated string"):
+        return True
+    return len(buffer) - error.pos <= TRUNCATION_SLACK
+
+
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def convert_cards(cards, output_file):
+    # Digests instead of (name, oracle_text) tuples keep the dedup set small
+    unique_cards = set()
+    for card in cards:
+        if card.get("lang") == "en":
+            card_name = card.get("name")
+            oracle_text = card.get("oracle_text")
+            if card_name and oracle_text:
+                unique_key = hashlib.blake2b(
+                    f"{card_name}\0{oracle_text}".encode("utf-8"), digest_size=16
+                ).digest()
+                if unique_key not in unique_cards:
+                    unique_cards.add(unique_key)
+                    json.dump(card, output_file)
+                    output_file.write("\n")
+    return len(unique_cards)
+
+
+def convert_file(filename, jsonl_filename):
+    with open(filename, "rb") as input_file, open(
+        jsonl_filename, "w", encoding="utf-8"
+    ) as output_file:
+        return convert_cards(iter_json_array(read_chunks(input_file)), output_file)
+
+
 def download_file(url, filename):
     response = requests.get(url, stream=True)
     total_size = int(response.headers.get("content-length", 0))
@@ -22,7 +142,7 @@ def download_file(url, filename):
         unit_scale=True,
         unit_divisor=1024,
     ) as progress_bar:
-        for data in response.iter_content(chunk_size=1024):
+        for data in response.iter_content(chunk_size=CHUNK_SIZE):
             size = file.write(data)
             progress_bar.update(size)
 
@@ -31,35 +151,73 @@ def download_file(url, filename):
 
     # Now parse the downloaded file and save it as JSONL
     jsonl_filename = f"{filename}.jsonl"
-    unique_cards = set()
-    with open(filename, "r", encoding="utf-8") as input_file, open(
-        jsonl_filename, "w", encoding="utf-8"
-    ) as output_file:
-        data = json.load(input_file)
-        for card in data:
-            if card.get("lang") == "en":
-                card_name = card.get("name")
-                oracle_text = card.get("oracle_text")
-                if card_name and oracle_text:
-                    unique_key = (card_name, oracle_text)
-                    if unique_key not in unique_cards:
-                        unique_cards.add(unique_key)
-                        json.dump(card, output_file)
-                        output_file.write("\n")
+    total_unique = convert_file(filename, jsonl_filename)
 
     print(f"Converted to JSONL format: {jsonl_filename}")
-    print(f"Total unique cards: {len(unique_cards)}")
+    print(f"Total unique cards: {total_unique}")
+    return jsonl_filename
+
+
+def stream_file(url, filename):
+    """Convert straight from the HTTP response without writing the raw dump to disk."""
+    response = requests.get(url, stream=True)
+    total_size = int(response.headers.get("content-length", 0))
+
+    start_time = time.time()
+    jsonl_filename = f"{filename}.jsonl"
+    with open(jsonl_filename, "w", encoding="utf-8") as output_file, tqdm(
+        desc=filename,
+        total=total_size,
+        unit="iB",
+        unit_scale=True,
+        unit_divisor=1024,
+    ) as progress_bar:
+
+        def chunks():
+            for data in response.iter_content(chunk_size=CHUNK_SIZE):
+                progress_bar.update(len(data))
+                yield data
+
+        total_unique = convert_cards(iter_json_array(chunks()), output_file)
+
+    end_time = time.time()
+    print(f"Download and conversion completed in {end_time - start_time:.2f} seconds")
+    print(f"Converted to JSONL format: {jsonl_filename}")
+    print(f"Total unique cards: {total_unique}")
     return jsonl_filename
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Download the Scryfall card dataset")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Convert directly from the download without keeping the raw JSON file",
+    )
+    parser.add_argument(
+        "--from-file",
+        help="Convert an already downloaded Scryfall bulk file instead of downloading",
+    )
+    args = parser.parse_args()
+
+    filename = "all_cards"
+
+    if args.from_file:
+        jsonl_filename = f"{filename}.jsonl"
+        total_unique = convert_file(args.from_file, jsonl_filename)
+        print(f"Total unique cards: {total_unique}")
+        print(f"File saved as {jsonl_filename}")
+        return
+
     bulk_data = get_bulk_data()
 
     download_url = bulk_data["download_uri"]
-    filename = "all_cards"
 
     print(f"Downloading {bulk_data['name']} dataset...")
-    jsonl_filename = download_file(download_url, filename)
+    if args.stream:
+        jsonl_filename = stream_file(download_url, filename)
+    else:
+        jsonl_filename = download_file(download_url, filename)
     print(f"File saved as {jsonl_filename}")
 
 
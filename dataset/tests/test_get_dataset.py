@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from get_dataset import convert_file, iter_json_array, read_chunks  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "all_cards_sample.json")
+
+
+def split(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    def setUp(self):
+        with open(FIXTURE, "rb") as file:
+            self.data = file.read()
+        self.expected = json.loads(self.data)
+
+    def test_fixture_at_every_chunk_size(self):
+        # Small sizes cut every token and multi-byte character somewhere
+        for size in [1, 2, 3, 5, 7, 16, 64, 1000, len(self.data)]:
+            with self.subTest(size=size):
+                self.assertEqual(
+                    list(iter_json_array(split(self.data, size))), self.expected
+                )
+
+    def test_numbers_across_chunks(self):
+        for text in ["[1, 23, 456]", "[1.5e3, -0.25, 10, 7E-2]", "[0,123456789]"]:
+            for size in range(1, len(text) + 1):
+                with self.subTest(text=text, size=size):
+                    chunks = split(text.encode("utf-8"), size)
+                    self.assertEqual(list(iter_json_array(chunks)), json.loads(text))
+
+    def test_literals_across_chunks(self):
+        text = '[true, false, null, "a]b", {"x": [1, {}]}, []]'
+        for size in range(1, len(text) + 1):
+            with self.subTest(size=size):
+                chunks = split(text.encode("utf-8"), size)
+                self.assertEqual(list(iter_json_array(chunks)), json.loads(text))
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array([b"  [ ", b" ]"])), [])
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array([b'{"a": 1}']))
+
+    def test_syntax_error_fails_fast(self):
+        consumed = 0
+
+        def chunks():
+            nonlocal consumed
+            yield b'[{"a": 1}, {"a" 1}, '
+            consumed += 1
+            while True:
+                yield b'{"a": 1}, ' * 100
+                consumed += 1
+
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_array(chunks()))
+        self.assertLessEqual(consumed, 1)
+
+    def test_truncated_array(self):
+        for text in [b'[{"a": 1}, {"a": 2', b"[1, 2", b'[{"a": 1}', b'["abc']:
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    list(iter_json_array(split(text, 3)))
+
+    def test_max_element_size(self):
+        chunks = [b'["'] + [b"x" * 100] * 10 + [b'"]']
+        with self.assertRaises(ValueError):
+            list(iter_json_array(chunks, max_element_size=500))
+        self.assertEqual(
+            list(iter_json_array(chunks, max_element_size=2000)), ["x" * 1000]
+        )
+
+    def test_read_chunks(self):
+        file = io.BytesIO(self.data)
+        self.assertEqual(b"".join(read_chunks(file, chunk_size=10)), self.data)
+
+
+class ConvertFileTest(unittest.TestCase):
+    def test_convert_fixture(self):
+        with open(FIXTURE, encoding="utf-8") as file:
+            cards = json.load(file)
+
+        # English cards with oracle text, first of each (name, oracle_text)
+        expected = []
+        seen = set()
+        for card in cards:
+            key = (card.get("name"), card.get("oracle_text"))
+            if card.get("lang") == "en" and all(key) and key not in seen:
+                seen.add(key)
+                expected.append(card)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "all_cards.jsonl")
+            total = convert_file(FIXTURE, output)
+            with open(output, encoding="utf-8") as file:
+                written = [json.loads(line) for line in file]
+
+        self.assertEqual(total, len(expected))
+        self.assertEqual(written, expected)
+        self.assertEqual(
+            [card["name"] for card in written],
+            ["Fury Sliver", "Kor Outfitter", "Lim-Dûl's Vault", "Æther Vial"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,15 @@
 "use server";
 
-import { CardsResponse, Interaction } from "./types";
+import {
+  BatchRequest,
+  BatchResponse,
+  CardsResponse,
+  DeckChange,
+  Interaction,
+  InteractionsPage,
+  SavedDeck,
+  SavedDeckCard,
+} from "./types";
 
 const checkUrl = async (url: string): Promise<boolean> => {
   try {
@@ -148,6 +157,33 @@ export const getSearchResults = async (
   }
 };
 
+// Endpoint /recommendations/batch
+export const getBatchRecommendations = async (
+  requests: BatchRequest[],
+  userId: string,
+  timeout: number = 5
+): Promise<BatchResponse | null> => {
+  try {
+    const host = await detectHost();
+    const response = await fetch(`${host}/recommendations/batch`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        requests: requests,
+        userId: userId,
+        timeout: timeout,
+      }),
+    });
+    const data: BatchResponse = await response.json();
+    return data;
+  } catch (error) {
+    console.error("Error retrieving content", error);
+    return null;
+  }
+};
+
 // Endpoint /add_interaction
 export const addInteraction = async (
   cardId: string,
@@ -200,6 +236,33 @@ export const getInteractions = async (
   }
 };
 
+// Endpoint /get_interactions, only the interactions after `since`
+export const getInteractionsPage = async (
+  userId: string,
+  since: string | null,
+  limit: number
+): Promise<InteractionsPage | null> => {
+  try {
+    const host = await detectHost();
+    const response = await fetch(`${host}/get_interactions`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        userId: userId,
+        since: since,
+        limit: limit,
+      }),
+    });
+    const data: InteractionsPage = await response.json();
+    return data;
+  } catch (error) {
+    console.error("Error retrieving content", error);
+    return null;
+  }
+};
+
 // Endpoint /delete_all_interactions
 export const deleteAllInteractions = async (userId: string): Promise<void> => {
   try {
@@ -240,7 +303,38 @@ export const saveDeck = async (
   }
 };
 
-// Endpoint /get_deck
+// Endpoint /update_deck, quantities are added to (or taken from) the saved
+// ones. Returns the deck as saved after the change, or null if not applied
+export const updateDeck = async (
+  changes: DeckChange[],
+  userId: string
+): Promise<SavedDeckCard[] | null> => {
+  try {
+    const host = await detectHost();
+    const response = await fetch(`${host}/update_deck`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({
+        changes: changes,
+        userId: userId,
+      }),
+    });
+    if (!response.ok) {
+      console.error("Error updating deck", response.status);
+      return null;
+    }
+    const data: SavedDeck = await response.json();
+    return data.deck;
+  } catch (error) {
+    console.error("Error updating deck", error);
+    return null;
+  }
+};
+
+// Endpoint /get_deck, a JSON string of CardInfo[] whose card_type only has
+// the thumbnail fields (card_id, name, image_uri, color_identity)
 export const getDeck = async (userId: string): Promise<string | null> => {
   try {
     const host = await detectHost();
@@ -1,7 +1,12 @@
 "use client";
 
 import React, { useState, useEffect } from "react";
-import { CardType, Interaction, CardInfo } from "@/app/types";
+import {
+  CardType,
+  Interaction,
+  CardInfo,
+  BatchRequest,
+} from "@/app/types";
 import Card from "./Card";
 
 import Searchbar from "./Searchbar";
@@ -10,6 +15,7 @@ import {
   getRandomCards,
   getCardRecommendations,
   getUserRecommendations,
+  getBatchRecommendations,
   addInteraction,
 } from "@/app/api";
 
@@ -76,52 +82,68 @@ const CardSelection: React.FC<CardSelectionProps> = ({
   };
 
   const retrieveUserCards = () => {
+    // User and deck recommendations come back together in one round trip
+    const card_ids = cards.map((card) => card.card_id);
+    const requests: BatchRequest[] = [];
     if (interactions.length > 10) {
-      getUserRecommendations(
-        pageSize - cards.length,
-        userId,
-        selectedMana
-      ).then((newCards) => {
-        if (newCards) {
-          setCards((prevCards) => {
-            const combinedCards = [...prevCards, ...newCards.cards];
-            return combinedCards.length > pageSize
-              ? combinedCards.slice(0, pageSize)
-              : combinedCards;
-          });
-        }
+      requests.push({
+        type: "from_user",
+        id: "user",
+        numberOfCards: pageSize - cards.length,
+        selectedMana: selectedMana,
       });
-    } else if (cardInDeck.length > 0) {
-      const card_ids = cards.map((card) => card.card_id);
-      getCardRecommendations(
-        pageSize - cards.length,
-        card_ids,
-        userId,
-        selectedMana
-      ).then((newCards) => {
-        if (newCards) {
-          setCards((prevCards) => {
-            const combinedCards = [...prevCards, ...newCards.cards];
-            return combinedCards.length > pageSize
-              ? combinedCards.slice(0, pageSize)
-              : combinedCards;
-          });
+    }
+    if (cardInDeck.length > 0 && card_ids.length > 0) {
+      requests.push({
+        type: "from_items",
+        id: "deck",
+        numberOfCards: pageSize - cards.length,
+        cardIds: card_ids,
+        selectedMana: selectedMana,
+      });
+    }
+
+    const addCards = (newCards: CardType[]) => {
+      setCards((prevCards) => {
+        const shown = new Set(prevCards.map((card) => card.card_id));
+        const combinedCards = [...prevCards];
+        for (const card of newCards) {
+          if (!shown.has(card.card_id)) {
+            shown.add(card.card_id);
+            combinedCards.push(card);
+          }
         }
+        return combinedCards.length > pageSize
+          ? combinedCards.slice(0, pageSize)
+          : combinedCards;
       });
-    } else {
+    };
+
+    const addRandomCards = () => {
       getRandomCards(pageSize - cards.length, userId, selectedMana).then(
         (newCards) => {
           if (newCards) {
-            setCards((prevCards) => {
-              const combinedCards = [...prevCards, ...newCards.cards];
-              return combinedCards.length > pageSize
-                ? combinedCards.slice(0, pageSize)
-                : combinedCards;
-            });
+            addCards(newCards.cards);
           }
         }
       );
+    };
+
+    if (requests.length === 0) {
+      addRandomCards();
+      return;
     }
+
+    getBatchRecommendations(requests, userId).then((response) => {
+      const newCards = response
+        ? response.results.flatMap((result) => result.cards)
+        : [];
+      if (newCards.length > 0) {
+        addCards(newCards);
+      } else {
+        addRandomCards();
+      }
+    });
   };
 
   const handleCardClick = React.useCallback((card_id: string) => {
@@ -4,25 +4,57 @@ import CardSelection from "@/app/components/CardSelection";
 import { v5 as uuidv5 } from "uuid";
 
 import {
-  getInteractions,
+  getInteractionsPage,
   deleteAllInteractions,
   saveDeck,
+  updateDeck,
   getDeck,
 } from "./api";
-import { CardType, Interaction, CardInfo } from "./types";
-import { useState, useEffect } from "react";
+import {
+  CardType,
+  Interaction,
+  CardInfo,
+  DeckChange,
+  SavedDeckCard,
+} from "./types";
+import { useState, useEffect, useRef } from "react";
 import Sidebar from "@/app/components/Sidebar";
 
+const deckMatches = (saved: SavedDeckCard[], deck: CardInfo[]): boolean => {
+  const quantities = new Map(
+    saved.map((card) => [card.card_id, card.quantity])
+  );
+  return (
+    deck.length === quantities.size &&
+    deck.every(
+      (card) => quantities.get(card.card_type.card_id) === card.quantity
+    )
+  );
+};
+
 export default function Home() {
   const [userId, setUserId] = useState("");
   const [cardInDeck, setCardInDeck] = useState<CardInfo[]>([]);
   const [interactions, setInteractions] = useState<Interaction[]>([]);
 
   const numberOfCards = 15;
+  const interactionsPageSize = 200;
+
+  // Cursor after the last interaction we have, so only new ones are fetched
+  const interactionsCursor = useRef<string | null>(null);
+  const interactionsFetch = useRef<Promise<void>>(Promise.resolve());
 
   const [loadingInteractions, setLoadingInteractions] = useState(false);
   const [loadingDeck, setLoadingDeck] = useState(false);
 
+  // Latest deck and the number of deck updates still on their way
+  const deckRef = useRef<CardInfo[]>([]);
+  const deckUpdates = useRef(0);
+
+  useEffect(() => {
+    deckRef.current = cardInDeck;
+  }, [cardInDeck]);
+
   const NAMESPACE = "10bca8d5-4b85-4a5f-9fb2-5d9c1b9b5e96";
 
   const getCurrentIPAddress = async (): Promise<string | null> => {
@@ -62,25 +94,67 @@ export default function Home() {
     fetchData();
   }, []);
 
-  const fetchInteractions = async (userId: string) => {
+  const fetchInteractions = (userId: string) => {
+    // One fetch at a time, so two swipes never append the same page twice
+    interactionsFetch.current = interactionsFetch.current.then(() =>
+      fetchNewInteractions(userId)
+    );
+    return interactionsFetch.current;
+  };
+
+  const fetchNewInteractions = async (userId: string) => {
     setLoadingInteractions(true);
-    const interactions = await getInteractions(userId);
-    console.log(interactions);
-    if (interactions) {
-      setInteractions(interactions);
-      setLoadingInteractions(false);
-    } else {
-      setInteractions([]);
-      setLoadingInteractions(false);
+    let since = interactionsCursor.current;
+    let reset = since === null;
+    let fetched: Interaction[] = [];
+    while (true) {
+      const page = await getInteractionsPage(
+        userId,
+        since,
+        interactionsPageSize
+      );
+      if (!page) {
+        break;
+      }
+      if (page.reset) {
+        reset = true;
+        fetched = [];
+      }
+      fetched = fetched.concat(page.interactions);
+      since = page.cursor;
+      if (!page.hasMore) {
+        break;
+      }
+    }
+    interactionsCursor.current = since;
+    setInteractions((current) => (reset ? fetched : current.concat(fetched)));
+    setLoadingInteractions(false);
+  };
+
+  const sendDeckChange = async (changes: DeckChange[]) => {
+    deckUpdates.current += 1;
+    const saved = await updateDeck(changes, userId);
+    deckUpdates.current -= 1;
+    // A lost or diverged update is repaired by saving the whole deck
+    if (
+      saved === null ||
+      (deckUpdates.current === 0 && !deckMatches(saved, deckRef.current))
+    ) {
+      await saveDeck(JSON.stringify(deckRef.current), userId);
     }
   };
 
   const handleRemoveFromDeck = (card_id: string) => {
+    const removed = cardInDeck.find(
+      (card) => card.card_type.card_id === card_id
+    );
     const updatedDeck = cardInDeck.filter(
       (card) => card.card_type.card_id !== card_id
     );
     setCardInDeck(updatedDeck);
-    handleSaveDeck(updatedDeck);
+    if (removed) {
+      sendDeckChange([{ cardId: card_id, quantity: -removed.quantity }]);
+    }
   };
 
   const handleAddToDeck = (card: CardType) => {
@@ -98,7 +172,7 @@ export default function Home() {
       updatedDeck = [...cardInDeck, { card_type: card, quantity: 1 }];
     }
     setCardInDeck(updatedDeck);
-    handleSaveDeck(updatedDeck);
+    sendDeckChange([{ cardId: card.card_id, quantity: 1 }]);
   };
 
   const handleAddQuantity = (card_id: string) => {
@@ -109,6 +183,7 @@ export default function Home() {
           : card
       )
     );
+    sendDeckChange([{ cardId: card_id, quantity: 1 }]);
   };
 
   const handleRemoveQuantity = (card_id: string) => {
@@ -125,6 +200,7 @@ export default function Home() {
         return acc;
       }, [] as CardInfo[])
     );
+    sendDeckChange([{ cardId: card_id, quantity: -1 }]);
   };
 
   const handleClearDeck = () => {
@@ -135,6 +211,7 @@ export default function Home() {
   const handleClearInteractions = () => {
     deleteAllInteractions(userId)
       .then(() => {
+        interactionsCursor.current = null;
         setInteractions([]);
       })
       .catch((error) => {
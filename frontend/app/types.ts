@@ -34,6 +34,20 @@ export type CardInfo = {
   quantity: number;
 };
 
+export type DeckChange = {
+  cardId: string;
+  quantity: number;
+};
+
+export type SavedDeckCard = {
+  card_id: string;
+  quantity: number;
+};
+
+export type SavedDeck = {
+  deck: SavedDeckCard[];
+};
+
 export const PlaceholderCard: CardType = {
   card_id: "",
   oracle_id: "",
@@ -68,3 +82,34 @@ export type Interaction = {
   interaction_property_name: "added" | "discarded";
   weight: number;
 };
+
+export type InteractionsPage = {
+  interactions: Interaction[];
+  cursor: string | null;
+  hasMore: boolean;
+  reset: boolean;
+};
+
+export type BatchRequest = {
+  type: "from_item" | "from_items" | "from_user" | "search";
+  id?: string;
+  numberOfCards: number;
+  cardIds?: string[];
+  query?: string;
+  numberOfInteractions?: number;
+  numberOfDeck?: number;
+  selectedMana?: string[];
+  fields?: string[];
+  view?: "thumbnail" | "detail";
+};
+
+export type BatchResult = {
+  id: string | null;
+  cards: CardType[];
+  total: number;
+  error: string | null;
+};
+
+export type BatchResponse = {
+  results: BatchResult[];
+};